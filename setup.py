@@ -8,7 +8,7 @@ src_dir = os.path.join(os.path.dirname(__file__), 'src')
 # Dependencies are automatically detected, but it might need fine tuning.
 build_exe_options = {
     "packages": ["yawt", "transformers", "torch", "numpy", "tqdm", "requests", 
-                "dotenv", "srt", "logging", "iso639", "stjlib"],
+                "dotenv", "logging", "iso639", "stjlib"],
     "excludes": [],
     "include_files": [
         ("config/", "config/"),
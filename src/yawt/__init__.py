@@ -3,10 +3,13 @@
 from .transcription import (
     ModelResources,
     TranscriptionConfig,
+    Bitmap,
+    EncoderCache,
     load_and_optimize_model,
     model_generate_with_timeout,
     transcribe_segments,
     transcribe_single_segment,
+    transcribe_batch,
     transcribe_with_retry,
     retry_transcriptions,
     TimeoutException,
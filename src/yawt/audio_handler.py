@@ -9,13 +9,19 @@ from tqdm import tqdm
 import logging
 from yawt.config import SAMPLING_RATE, APP_NAME, APP_VERSION, CONTACT_INFO
 import mimetypes
+import hashlib
+import json
+import time
 from dataclasses import dataclass
+from typing import Optional
+from yawt.constants import UPLOAD_CACHE_PATH, UPLOAD_CACHE_MAX_AGE_SECONDS, CACHEABLE_UPLOAD_SERVICES, DOWNLOAD_CHUNK_SIZE
 
 @dataclass
 class AudioInput:
     input_url: str
     local_audio_path: str
     should_delete_local_audio_file: bool
+    audio_hash: Optional[str] = None  # SHA-256 of local_audio_path, when it was computed for upload
 
 def load_audio(input_file, sampling_rate=SAMPLING_RATE, download_timeout=None):
     """
@@ -62,6 +68,60 @@ def load_audio(input_file, sampling_rate=SAMPLING_RATE, download_timeout=None):
         logging.error(f"Unexpected error in load_audio: {str(e)}")
         raise
 
+def compute_audio_hash(file_path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file, reading it in 1 MiB chunks.
+    
+    Args:
+        file_path (str): Path to the file to hash.
+        chunk_size (int, optional): Number of bytes read per iteration. Defaults to 1 MiB.
+    
+    Returns:
+        str: Hex-encoded SHA-256 digest of the file contents.
+    """
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            # Python 3.11+: hashes in C without a Python-level read loop
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+def get_audio_duration(input_file):
+    """
+    Reads the duration of an audio or video file from its container metadata without decoding it.
+    
+    Args:
+        input_file (str): Path to the input audio or video file.
+    
+    Returns:
+        float or None: Duration in seconds, or None if it could not be determined.
+    """
+    try:
+        probe = ffmpeg.probe(input_file)
+        duration = probe.get('format', {}).get('duration')
+        if duration is None:
+            # Some containers only report the duration per stream
+            durations = [float(stream['duration']) for stream in probe.get('streams', []) if stream.get('duration')]
+            duration = max(durations) if durations else None
+        return float(duration) if duration is not None else None
+    except ffmpeg.Error as e:
+        logging.warning(f"FFprobe error: {e.stderr.decode() if e.stderr else str(e)}")
+        return None
+    except (ValueError, KeyError) as e:
+        logging.warning(f"Could not parse duration of {input_file}: {e}")
+        return None
+
+def _upload_fields(file_path, f, secret=None, expires=None):
+    # MultipartEncoder streams the open file object; optional fields must be set before it is built
+    fields = {'file': (os.path.basename(file_path), f)}
+    if secret:
+        fields['secret'] = secret
+    if expires:
+        fields['expires'] = expires
+    return fields
+
 def upload_file(file_path, service='0x0.st', secret=None, expires=None, supported_upload_services=None, upload_timeout=None):
     """
     Uploads a file to the specified service.
@@ -95,11 +155,7 @@ def upload_file(file_path, service='0x0.st', secret=None, expires=None, supporte
             headers = {'User-Agent': user_agent}
             logging.info(f"Uploading '{file_path}' to '{service}'...")
             with open(file_path, 'rb') as f:
-                encoder = MultipartEncoder(fields={'file': (os.path.basename(file_path), f)})
-                if secret:
-                    encoder.fields['secret'] = secret
-                if expires:
-                    encoder.fields['expires'] = expires
+                encoder = MultipartEncoder(fields=_upload_fields(file_path, f, secret, expires))
 
                 with tqdm(total=encoder.len, unit='B', unit_scale=True, desc="Uploading") as pbar:
                     def progress_callback(monitor):
@@ -125,11 +181,7 @@ def upload_file(file_path, service='0x0.st', secret=None, expires=None, supporte
             headers = {'User-Agent': f"{APP_NAME}/{APP_VERSION} ({CONTACT_INFO})"}
             logging.info(f"Uploading '{file_path}' to '{service}'...")
             with open(file_path, 'rb') as f:
-                encoder = MultipartEncoder(fields={'file': (os.path.basename(file_path), f)})
-                if secret:
-                    encoder.fields['secret'] = secret
-                if expires:
-                    encoder.fields['expires'] = expires
+                encoder = MultipartEncoder(fields=_upload_fields(file_path, f, secret, expires))
 
                 response = requests.post(
                     url,
@@ -154,6 +206,57 @@ def upload_file(file_path, service='0x0.st', secret=None, expires=None, supporte
         logging.error(f"Unexpected error during upload: {e}")
         raise
 
+def _load_upload_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable upload cache {cache_path}: {e}")
+        return {}
+
+def _save_upload_cache(cache, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temporary file first so concurrent runs never read a partial cache
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(cache_path), suffix='.tmp', delete=False) as f:
+            json.dump(cache, f)
+            temp_path = f.name
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Failed to update upload cache: {e}")
+
+def upload_file_cached(file_path, file_hash, service='0x0.st', supported_upload_services=None, upload_timeout=None, cache_path=UPLOAD_CACHE_PATH):
+    """
+    Uploads a file, reusing the URL of a recent upload of identical content to the same service.
+    
+    Args:
+        file_path (str): Path to the file to upload.
+        file_hash (str): Content hash of the file (see compute_audio_hash).
+        service (str): The upload service to use. Defaults to '0x0.st'.
+        supported_upload_services (set, optional): Set of supported upload services.
+        upload_timeout (int, optional): Timeout for the upload in seconds.
+        cache_path (str, optional): Path of the JSON upload cache.
+    
+    Returns:
+        str: URL of the uploaded file.
+    """
+    if service not in CACHEABLE_UPLOAD_SERVICES:
+        return upload_file(file_path, service=service, supported_upload_services=supported_upload_services, upload_timeout=upload_timeout)
+
+    cache_key = f"{service}:{file_hash}"
+    cache = _load_upload_cache(cache_path)
+    entry = cache.get(cache_key)
+    if entry and time.time() - entry.get('uploaded_at', 0) < UPLOAD_CACHE_MAX_AGE_SECONDS:
+        logging.info(f"Reusing previous upload of '{file_path}': {entry['url']}")
+        return entry['url']
+
+    file_url = upload_file(file_path, service=service, supported_upload_services=supported_upload_services, upload_timeout=upload_timeout)
+    cache[cache_key] = {'url': file_url, 'uploaded_at': time.time()}
+    _save_upload_cache(cache, cache_path)
+    return file_url
+
 def download_audio(audio_url, destination_dir=None, download_timeout=None):
     """
     Downloads an audio file from the given URL to the specified directory.
@@ -177,7 +280,7 @@ def download_audio(audio_url, destination_dir=None, download_timeout=None):
             if r.status_code == 200:
                 file_path = os.path.join(destination_dir, 'audio.wav')
                 with open(file_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                         if chunk:
                             f.write(chunk)
                 
@@ -224,6 +327,22 @@ def handle_audio_input(args, supported_upload_services, upload_timeout):
     Raises:
         SystemExit: If downloading or uploading fails.
     """
+    use_cache = not getattr(args, 'no_cache', False)
+    audio_hash = None
+
+    def upload(path):
+        nonlocal audio_hash
+        if not use_cache:
+            return upload_file(path, service='0x0.st', supported_upload_services=supported_upload_services, upload_timeout=upload_timeout)
+        audio_hash = compute_audio_hash(path)
+        return upload_file_cached(
+            path,
+            audio_hash,
+            service='0x0.st',
+            supported_upload_services=supported_upload_services,
+            upload_timeout=upload_timeout
+        )
+
     if args.audio_url:
         input_url = args.audio_url
         logging.info(f"Using provided input URL: {input_url}")
@@ -248,12 +367,7 @@ def handle_audio_input(args, supported_upload_services, upload_timeout):
                 logging.info(f"Extracted audio to: {local_audio_path}")
 
                 # Upload the extracted audio to obtain a new input_url
-                input_url = upload_file(
-                    local_audio_path,
-                    service='0x0.st',
-                    supported_upload_services=supported_upload_services,
-                    upload_timeout=upload_timeout
-                )
+                input_url = upload(local_audio_path)
                 logging.info(f"Uploaded extracted audio to '0x0.st': {input_url}")
             else:
                 logging.info("Provided URL points to an audio file. Using it directly.")
@@ -285,24 +399,14 @@ def handle_audio_input(args, supported_upload_services, upload_timeout):
                 should_delete_local_audio_file = True
             # Upload the extracted audio to obtain input_url
             try:
-                input_url = upload_file(
-                    local_audio_path,
-                    service='0x0.st',
-                    supported_upload_services=supported_upload_services,
-                    upload_timeout=upload_timeout
-                )
+                input_url = upload(local_audio_path)
                 logging.info(f"Uploaded extracted audio to '0x0.st': {input_url}")
             except Exception as e:
                 logging.error(f"Failed to upload extracted audio: {e}")
                 sys.exit(1)
         else:
             try:
-                input_url = upload_file(
-                    input_file, 
-                    service='0x0.st', 
-                    supported_upload_services=supported_upload_services,
-                    upload_timeout=upload_timeout
-                )
+                input_url = upload(input_file)
                 logging.info(f"Uploaded to '0x0.st': {input_url}")
                 local_audio_path = input_file
                 # Indicate that the local audio file should not be deleted
@@ -311,4 +415,4 @@ def handle_audio_input(args, supported_upload_services, upload_timeout):
                 logging.error(f"Failed to upload audio: {e}")
                 sys.exit(1)
     
-    return AudioInput(input_url, local_audio_path, should_delete_local_audio_file)
+    return AudioInput(input_url, local_audio_path, should_delete_local_audio_file, audio_hash)
@@ -0,0 +1,112 @@
+# backends.py
+
+import logging
+import math
+from typing import Optional, Protocol, Tuple
+import numpy as np
+import torch
+from yawt.constants import CTRANSLATE2_MODEL_NAMES, MODEL_SETTINGS, QUANTIZATION_NONE
+from yawt.exceptions import ModelLoadError
+from yawt.transcription import ModelConfig, get_device, get_torch_dtype
+
+try:
+    from faster_whisper import WhisperModel  # Optional CTranslate2 inference backend
+except ImportError:
+    WhisperModel = None
+
+class TranscriptionBackend(Protocol):
+    """
+    A non-transformers model that transcribes a whole audio chunk in one call.
+    """
+    def transcribe(
+        self,
+        chunk: np.ndarray,
+        language: str,
+        initial_prompt: Optional[str] = None
+    ) -> Tuple[str, float, Optional[str]]:
+        ...
+
+class FasterWhisperBackend:
+    """
+    Runs Whisper through faster-whisper's CTranslate2 engine.
+    """
+    def __init__(self, model: "WhisperModel"):
+        self.model = model
+
+    def transcribe(
+        self,
+        chunk: np.ndarray,
+        language: str,
+        initial_prompt: Optional[str] = None
+    ) -> Tuple[str, float, Optional[str]]:
+        """
+        Transcribes one audio chunk with greedy decoding.
+
+        Args:
+            chunk: 16 kHz mono float32 audio.
+            language: Language to decode in.
+            initial_prompt: Optional context prompt for the decoder.
+
+        Returns:
+            Tuple of (transcription, confidence, language). The confidence is the mean
+            per-token probability, exp(avg_logprob), averaged over the decoded segments.
+        """
+        segments, info = self.model.transcribe(
+            chunk,
+            language=language,
+            beam_size=1,
+            initial_prompt=initial_prompt,
+            word_timestamps=False
+        )
+        segments = list(segments)  # faster-whisper decodes lazily
+        if not segments:
+            return "", 0.0, info.language
+        transcription = "".join(segment.text for segment in segments).strip()
+        confidence = sum(math.exp(segment.avg_logprob) for segment in segments) / len(segments)
+        return transcription, confidence, info.language
+
+def load_faster_whisper_model(model_id: str) -> ModelConfig:
+    """
+    Loads a supported Whisper model through faster-whisper.
+
+    Weights run as int8 with float16 activations on CUDA, and as int8 on CPU.
+
+    Args:
+        model_id (str): The Hugging Face identifier of a supported model.
+
+    Returns:
+        ModelConfig: A config whose `backend` is set and whose `model` and `processor` are None.
+
+    Raises:
+        ModelLoadError: If faster-whisper is not installed or the model cannot be loaded.
+    """
+    if WhisperModel is None:
+        raise ModelLoadError("The ctranslate2 backend requires the 'faster-whisper' package.")
+    model_name = CTRANSLATE2_MODEL_NAMES.get(model_id)
+    model_settings = MODEL_SETTINGS.get(model_id)
+    if model_name is None or model_settings is None:
+        raise ModelLoadError(f"Unsupported model_id for the ctranslate2 backend: {model_id}")
+
+    device = get_device()
+    # CTranslate2 runs on CUDA or CPU only
+    if device.type != "cuda":
+        device = torch.device("cpu")
+    compute_type = "int8_float16" if device.type == "cuda" else "int8"
+
+    try:
+        logging.info(f"Loading faster-whisper model '{model_name}' on {device} with compute type {compute_type}...")
+        model = WhisperModel(model_name, device=device.type, compute_type=compute_type)
+    except Exception as e:
+        logging.exception(f"Failed to load faster-whisper model: {e}")
+        raise ModelLoadError("Failed to load the faster-whisper model.") from e
+
+    return ModelConfig(
+        model=None,
+        processor=None,
+        device=device,
+        torch_dtype=get_torch_dtype(device),
+        batch_size=model_settings["batch_size"],
+        chunk_length_s=model_settings["chunk_length_s"],
+        quantization=QUANTIZATION_NONE,
+        backend=FasterWhisperBackend(model)
+    )
@@ -1,3 +1,5 @@
+import os
+
 # Model generation parameters
 MODEL_RETURN_DICT_IN_GENERATE = True  # Required for confidence calculation
 MODEL_OUTPUT_SCORES = True            # Required for confidence calculation
@@ -7,6 +9,17 @@ MODEL_USE_CACHE = True               # Performance optimization
 WHISPER_LARGE_V3 = "openai/whisper-large-v3"
 WHISPER_LARGE_V3_TURBO = "openai/whisper-large-v3-turbo"
 
+# Inference backends
+BACKEND_TRANSFORMERS = "transformers"  # Hugging Face transformers (default)
+BACKEND_CTRANSLATE2 = "ctranslate2"    # faster-whisper on CTranslate2 (requires the 'faster-whisper' package)
+BACKENDS = (BACKEND_TRANSFORMERS, BACKEND_CTRANSLATE2)
+
+# faster-whisper names for the supported models
+CTRANSLATE2_MODEL_NAMES = {
+    WHISPER_LARGE_V3: "large-v3",
+    WHISPER_LARGE_V3_TURBO: "large-v3-turbo",
+}
+
 # Model Parameters
 MODEL_SETTINGS = {
     WHISPER_LARGE_V3: {
@@ -19,5 +32,33 @@ MODEL_SETTINGS = {
     },
 }
 
+# Weight quantization modes accepted by --quantization
+QUANTIZATION_NONE = "none"
+QUANTIZATION_INT8_DYNAMIC = "int8_dynamic"  # PyTorch dynamic int8 on nn.Linear (CPU only)
+QUANTIZATION_INT4_HQQ = "int4_hqq"          # Half-Quadratic int4 weights (requires the 'hqq' package)
+QUANTIZATION_INT8 = "int8"                  # bitsandbytes LLM.int8() weights (CUDA, requires 'bitsandbytes')
+QUANTIZATION_INT4 = "int4"                  # bitsandbytes NF4 weights (CUDA, requires 'bitsandbytes')
+QUANTIZATION_BITSANDBYTES = (QUANTIZATION_INT8, QUANTIZATION_INT4)
+QUANTIZATION_MODES = (
+    QUANTIZATION_NONE,
+    QUANTIZATION_INT8_DYNAMIC,
+    QUANTIZATION_INT4_HQQ,
+    QUANTIZATION_INT8,
+    QUANTIZATION_INT4,
+)
+
 # Speaker recognition API name
-SPEAKER_RECOGNITION_API = "pyannote"
\ No newline at end of file
+SPEAKER_RECOGNITION_API = "pyannote"
+
+# On-disk cache for diarization results, keyed by audio content hash
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "yawt")
+DIARIZATION_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "diarization")
+INDUCTOR_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "inductor")  # Compiled graphs reused across runs
+
+# Read size for streamed downloads; large enough to keep per-chunk overhead negligible
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# On-disk cache of uploaded file URLs, keyed by service and content hash
+UPLOAD_CACHE_PATH = os.path.join(CACHE_DIRECTORY, "uploads.json")
+UPLOAD_CACHE_MAX_AGE_SECONDS = 24 * 3600  # Re-upload after a day in case the host expired the file
+CACHEABLE_UPLOAD_SERVICES = {"0x0.st"}   # file.io links are single-download, so they are never reused
@@ -2,6 +2,10 @@ import requests
 import logging
 import time
 import sys
+import os
+import json
+import tempfile
+from yawt.constants import DIARIZATION_CACHE_DIRECTORY
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 
 def is_rate_limit_exception(exception):
@@ -221,3 +225,64 @@ def perform_diarization(pyannote_token, audio_url, num_speakers, diarization_tim
 
     logging.debug(f"Formatted Segments: {formatted_segments}")  # Additional logging
     return formatted_segments
+
+def get_diarization_cache_path(audio_hash, num_speakers=None, cache_directory=DIARIZATION_CACHE_DIRECTORY):
+    """
+    Builds the cache file path for a diarization result.
+
+    Args:
+        audio_hash (str): Content hash of the diarized audio.
+        num_speakers (int, optional): Number of speakers requested, since it changes the result.
+        cache_directory (str, optional): Directory holding cached results.
+
+    Returns:
+        str: Path of the JSON cache file.
+    """
+    file_name = f"{audio_hash}-speakers{num_speakers}.json" if num_speakers else f"{audio_hash}.json"
+    return os.path.join(cache_directory, file_name)
+
+def load_cached_diarization(audio_hash, num_speakers=None, cache_directory=DIARIZATION_CACHE_DIRECTORY):
+    """
+    Loads previously cached diarization segments.
+
+    Args:
+        audio_hash (str): Content hash of the diarized audio.
+        num_speakers (int, optional): Number of speakers requested.
+        cache_directory (str, optional): Directory holding cached results.
+
+    Returns:
+        list or None: Cached diarization segments, or None on a cache miss or unreadable entry.
+    """
+    cache_path = get_diarization_cache_path(audio_hash, num_speakers, cache_directory)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            segments = json.load(f)
+        logging.info(f"Loaded cached diarization from {cache_path}")
+        return segments
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable diarization cache {cache_path}: {e}")
+        return None
+
+def save_cached_diarization(audio_hash, segments, num_speakers=None, cache_directory=DIARIZATION_CACHE_DIRECTORY):
+    """
+    Persists diarization segments so reruns on the same audio can skip the API call.
+
+    Args:
+        audio_hash (str): Content hash of the diarized audio.
+        segments (list): Formatted diarization segments to cache.
+        num_speakers (int, optional): Number of speakers requested.
+        cache_directory (str, optional): Directory holding cached results.
+    """
+    cache_path = get_diarization_cache_path(audio_hash, num_speakers, cache_directory)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        # Write to a temporary file first so concurrent runs never read a partial entry
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_directory, suffix='.tmp', delete=False) as f:
+            json.dump(segments, f)
+            temp_path = f.name
+        os.replace(temp_path, cache_path)
+        logging.info(f"Cached diarization result to {cache_path}")
+    except OSError as e:
+        logging.warning(f"Failed to cache diarization result: {e}")
@@ -29,7 +29,9 @@ import transformers
 
 import argparse
 import json
+import re
 import time
+from functools import lru_cache
 import numpy as np
 import requests
 from tqdm import tqdm
@@ -38,7 +40,6 @@ from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
 from dotenv import load_dotenv
 import tempfile
 from datetime import datetime, timedelta, timezone
-import srt
 import logging  # Import logging module to use logging throughout the script
 from typing import Optional, Tuple  # Add this import at the top with other imports
 
@@ -52,15 +53,24 @@ from yawt.config import (
 # Setup environment variable to disable file validation in pydev debugger
 os.environ['PYDEVD_DISABLE_FILE_VALIDATION'] = '1'
 
-from yawt.audio_handler import load_audio, upload_file, download_audio, handle_audio_input
-from yawt.diarization import submit_diarization_job, wait_for_diarization, perform_diarization
+from yawt.audio_handler import load_audio, upload_file, download_audio, handle_audio_input, get_audio_duration, compute_audio_hash
+from yawt.diarization import (
+    submit_diarization_job,
+    wait_for_diarization,
+    perform_diarization,
+    load_cached_diarization,
+    save_cached_diarization,
+)
 from yawt.transcription import (
     transcribe_segments,
     retry_transcriptions,
     load_and_optimize_model,
     ModelResources,          # Import ModelResources
+    Bitmap,
+    EncoderCache,
     TranscriptionConfig,      # Import TranscriptionConfig
 )
+from yawt.backends import load_faster_whisper_model
 from yawt.output_writer import write_transcriptions
 
 from yawt.exceptions import ModelLoadError, DiarizationError, TranscriptionError  # Import custom exceptions
@@ -73,7 +83,12 @@ from yawt.constants import (
     MODEL_RETURN_DICT_IN_GENERATE,
     MODEL_OUTPUT_SCORES,
     MODEL_USE_CACHE,
-    SPEAKER_RECOGNITION_API
+    SPEAKER_RECOGNITION_API,
+    QUANTIZATION_NONE,
+    QUANTIZATION_MODES,
+    BACKEND_TRANSFORMERS,
+    BACKEND_CTRANSLATE2,
+    BACKENDS
 )
 
 def check_api_tokens(pyannote_token, openai_key):
@@ -95,52 +110,58 @@ def check_api_tokens(pyannote_token, openai_key):
         logging.error("OPENAI_KEY is not set. Please provide it via the config file or environment variable.")
         sys.exit(1)
 
-def integrate_context_prompt(context_prompt: Optional[str], processor, device, torch_dtype):
+def map_speakers(diarization_segments):
     """
-    Integrates context prompt into transcription by tokenizing and preparing decoder input ids.
-    
+    Maps speaker labels to unique speaker IDs.
+
+    Speaker IDs are kept as integers while segments are processed and are only
+    turned into display strings (see format_speaker_id) when the STJ document is built.
+
     Args:
-        context_prompt: The context prompt string.
-        processor: The processor for the transcription model.
-        device: The device to run the model on.
-        torch_dtype: The data type for torch tensors.
-    
+        diarization_segments (list): List of diarization segments with 'speaker' key.
+
     Returns:
-        torch.Tensor or None: The decoder input ids if context prompt is provided, else None.
+        list: List of speaker dictionaries with integer 'id' and display 'name'.
+    """
+    if not diarization_segments:
+        return []
+    # Factorize the labels in C; np.unique sorts, so re-rank by first appearance
+    labels = np.array([segment['speaker'] for segment in diarization_segments], dtype=object)
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_index), dtype=np.int64)
+    rank[np.argsort(first_index)] = np.arange(1, len(first_index) + 1)
+    for segment, speaker_id in zip(diarization_segments, rank[inverse.ravel()].tolist()):
+        segment['speaker_id'] = speaker_id
+    return [{'id': counter, 'name': f"Speaker {counter}"} for counter in range(1, len(first_index) + 1)]
+
+def format_speaker_id(speaker_id):
     """
-    if context_prompt:
-        logging.info("Integrating context prompt into transcription.")
-        # Tokenize the context prompt without adding special tokens
-        prompt_encoded = processor.tokenizer(context_prompt, return_tensors="pt", add_special_tokens=False)
-        # Move the input ids to the specified device and dtype
-        decoder_input_ids = prompt_encoded['input_ids'].to(device).to(torch_dtype).long()
-        return decoder_input_ids
-    return None
+    Converts an internal integer speaker ID to its output form (e.g. 1 -> "Speaker1").
 
-def map_speakers(diarization_segments):
+    Args:
+        speaker_id (int or None): Internal speaker ID.
+
+    Returns:
+        str or None: The output speaker ID, or None if no speaker is assigned.
     """
-    Maps speaker labels to unique speaker IDs.
+    return f"Speaker{speaker_id}" if speaker_id is not None else None
+
+@lru_cache(maxsize=32)
+def _lang_to_pt1(code):
+    """
+    Converts a language code to its ISO 639-1 (2-letter) form.
+
+    Transcripts typically use one or two languages across many segments, so lookups are cached.
 
     Args:
-        diarization_segments (list): List of diarization segments with 'speaker' key.
+        code (str or None): Language code as detected by the model.
 
     Returns:
-        list: List of speaker dictionaries with 'id' and 'name'.
+        str or None: The ISO 639-1 code, or None if no language was detected.
     """
-    speaker_mapping = {}
-    speakers = []
-    speaker_counter = 1
-    for segment in diarization_segments:
-        speaker = segment['speaker']
-        if speaker not in speaker_mapping:
-            # Assign a unique ID to each new speaker
-            speaker_id = f"Speaker{speaker_counter}"
-            speaker_mapping[speaker] = {'id': speaker_id, 'name': f'Speaker {speaker_counter}'}
-            speakers.append({'id': speaker_id, 'name': f'Speaker {speaker_counter}'})
-            speaker_counter += 1
-        # Add speaker ID to the segment
-        segment['speaker_id'] = speaker_mapping[speaker]['id']
-    return speakers
+    return Lang(code).pt1 if code else None
+
+_FORMAT_SEPARATOR = re.compile(r'[,\s]+')
 
 def validate_output_formats(formats):
     """
@@ -156,18 +177,17 @@ def validate_output_formats(formats):
         argparse.ArgumentTypeError: If invalid formats are provided.
     """
     valid = {'text', 'stj', 'srt'}
-    if isinstance(formats, list):
-        # Join all elements and split to handle comma-separated or space-separated inputs
-        formats = ' '.join(formats).replace(',', ' ').split()
-    elif isinstance(formats, str):
-        formats = formats.replace(',', ' ').split()
-    # Clean and lowercase the format strings
-    formats = [fmt.strip().lower() for fmt in formats if fmt.strip()]
+    # Join list input so comma- and space-separated values share one split path
+    joined = ' '.join(formats) if isinstance(formats, list) else formats
+    formats = [fmt.lower() for fmt in _FORMAT_SEPARATOR.split(joined) if fmt]
     invalid = set(formats) - valid
     if invalid:
         raise argparse.ArgumentTypeError(f"Invalid formats: {', '.join(invalid)}. Choose from text, stj, srt.")
     return formats
 
+_INV_60 = 1 / 60.0
+_INV_3600 = 1 / 3600.0
+
 def calculate_cost(duration_seconds, cost_per_minute, pyannote_cost_per_hour):
     """
     Calculates the estimated cost based on audio duration.
@@ -180,8 +200,8 @@ def calculate_cost(duration_seconds, cost_per_minute, pyannote_cost_per_hour):
     Returns:
         tuple: Whisper cost, Diarization cost, Total cost.
     """
-    minutes = duration_seconds / 60
-    hours = duration_seconds / 3600
+    minutes = duration_seconds * _INV_60
+    hours = duration_seconds * _INV_3600
     whisper = minutes * cost_per_minute
     diarization = hours * pyannote_cost_per_hour
     total = whisper + diarization
@@ -219,6 +239,7 @@ def parse_arguments():
     parser.add_argument('--secondary-language', type=str, help='Secondary language of the audio.')  # Remains optional
     parser.add_argument('--num-speakers', type=int, help='Specify the number of speakers if known.')
     parser.add_argument('--dry-run', action='store_true', help='Estimate cost without processing.')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not store cached uploads and diarization results.')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
     parser.add_argument("--pyannote-token", help="Pyannote API token (overrides environment variable)")
@@ -226,6 +247,14 @@ def parse_arguments():
     parser.add_argument("--model", type=str, default="openai/whisper-large-v3",
                         choices=["openai/whisper-large-v3", "openai/whisper-large-v3-turbo"],
                         help="OpenAI transcription model to use")
+    parser.add_argument('--backend', type=str, default=BACKEND_TRANSFORMERS, choices=BACKENDS,
+                        help='Inference backend: transformers (default) or ctranslate2 (faster-whisper, int8; requires the faster-whisper package).')
+    parser.add_argument('--quantization', type=str, default=QUANTIZATION_NONE, choices=QUANTIZATION_MODES,
+                        help='Weight quantization for the transcription model (int8_dynamic is CPU-only; int4_hqq requires the hqq package; int8/int4 use bitsandbytes on CUDA).')
+    parser.add_argument('--pack-segments', action='store_true',
+                        help='Transcribe runs of short diarization segments together in shared 30-second windows, splitting the text back by word timestamps.')
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the model with torch.compile (slower startup, faster inference).')
     parser.add_argument('--output-format', type=str, nargs='+', default=['text'],
                         help='Desired output format(s): text, stj, srt.')
     parser.add_argument("-o", "--output", help="Base path for output files (without extension)")
@@ -265,10 +294,8 @@ def construct_output_paths(args, audio_input) -> Tuple[str, str]:
     if args.output:
         # Use provided output directory
         output_dir = args.output
-        # Create output directory if it doesn't exist
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            logging.info(f"Created output directory: {output_dir}")
+        # Create output directory if it doesn't exist (safe against concurrent runs)
+        os.makedirs(output_dir, exist_ok=True)
         # Construct full base name including directory
         base_name = os.path.join(output_dir, base_filename)
     else:
@@ -354,20 +381,14 @@ def main():
     
         # Load and optimize the transcription model
         model_id = args.model or config.model.default_model_id  # Use config default if args.model is None
-        model_config = load_and_optimize_model(model_id)
-
-        # Integrate context prompt into the transcription process if provided
-        decoder_input_ids = integrate_context_prompt(
-            context_prompt=args.context_prompt,
-            processor=model_config.processor,
-            device=model_config.device,
-            torch_dtype=model_config.torch_dtype
-        )
+        if args.backend == BACKEND_CTRANSLATE2:
+            model_config = load_faster_whisper_model(model_id)
+        else:
+            model_config = load_and_optimize_model(model_id, quantization=args.quantization, compile_model=args.compile)
 
         # Prepare generate_kwargs for initial transcription
+        # The context prompt ids are built from the transcription config by generate_kwargs_template
         generate_kwargs = {}
-        if decoder_input_ids is not None:
-            generate_kwargs["decoder_input_ids"] = decoder_input_ids
 
         # Do not set generate_kwargs["language"] here
         # The language will be set within the transcription functions based on the main_language parameter
@@ -380,7 +401,10 @@ def main():
             torch_dtype=model_config.torch_dtype,
             generate_kwargs=generate_kwargs,
             batch_size=model_config.batch_size,
-            chunk_length_s=model_config.chunk_length_s
+            chunk_length_s=model_config.chunk_length_s,
+            quantization=model_config.quantization,
+            backend=model_config.backend,
+            encoder_cache=EncoderCache() if model_config.backend is None else None
         )
 
         # Create TranscriptionConfig instance with context prompt
@@ -389,7 +413,8 @@ def main():
             max_target_positions=config.transcription.max_target_positions,
             buffer_tokens=config.transcription.buffer_tokens,
             confidence_threshold=config.transcription.confidence_threshold,
-            context_prompt=args.context_prompt  # Pass context prompt from args
+            context_prompt=args.context_prompt,  # Pass context prompt from args
+            pack_segments=args.pack_segments
         )
     
         # Handle audio input, either from URL or local file
@@ -399,38 +424,69 @@ def main():
             upload_timeout=config.timeouts.upload_timeout
         )
         
+        # Read the duration from the container so dry runs don't have to decode the audio
+        total_duration = get_audio_duration(audio_input.local_audio_path)
+        audio_array = None
+        if total_duration is None:
+            audio_array = load_audio(audio_input.local_audio_path)
+            total_duration = len(audio_array) / SAMPLING_RATE
+        whisper_cost, diarization_cost, total_cost = calculate_cost(
+            total_duration, config.api_costs.whisper_cost_per_minute, config.api_costs.pyannote_cost_per_hour
+        )
+    
+        # Handle dry-run option to estimate costs without actual processing
+        if args.dry_run:
+            print(f"Estimated cost: ${total_cost:.4f} USD")
+            sys.exit(0)
+    
+        logging.info(f"Processing cost: Whisper=${whisper_cost:.4f}, Diarization=${diarization_cost:.4f}, Total=${total_cost:.4f}")
+    
         # Load the audio array before any potential deletion
-        audio_array = load_audio(audio_input.local_audio_path)
+        if audio_array is None:
+            audio_array = load_audio(audio_input.local_audio_path)
+        # Keep the waveform in float16 to halve its memory; slices are upcast before feature extraction
+        audio_array = audio_array.astype(np.float16, copy=False)
         
         # Determine output paths using the helper function
         output_dir, base_name = construct_output_paths(args, audio_input)
         
-        # Initialize processed_segments as an empty set (in-memory)
-        processed_segments = set()
-
-        # Submit diarization job and wait for its completion
-        try:
-            diarization_segments = perform_diarization(
-                config.pyannote_token, 
-                audio_input.input_url, 
-                args.num_speakers, 
-                config.timeouts.diarization_timeout,
-                config.timeouts.job_status_timeout
-            )
-        except Exception as e:
-            logging.exception(f"Diarization error: {e}")
-            if os.path.exists(audio_input.local_audio_path) and audio_input.should_delete_local_audio_file:
-                try:
-                    os.remove(audio_input.local_audio_path)
-                    logging.info(f"Deleted temporary file: {audio_input.local_audio_path}")
-                except Exception as cleanup_error:
-                    logging.warning(f"Cleanup failed: {cleanup_error}")
-            sys.exit(1)
+        # Reuse a cached diarization of the same audio when available
+        audio_hash = None
+        diarization_segments = None
+        if not args.no_cache:
+            # Reuse the hash computed for the upload cache when there is one
+            audio_hash = audio_input.audio_hash or compute_audio_hash(audio_input.local_audio_path)
+            diarization_segments = load_cached_diarization(audio_hash, args.num_speakers)
+
+        if diarization_segments is None:
+            # Submit diarization job and wait for its completion
+            try:
+                diarization_segments = perform_diarization(
+                    config.pyannote_token, 
+                    audio_input.input_url, 
+                    args.num_speakers, 
+                    config.timeouts.diarization_timeout,
+                    config.timeouts.job_status_timeout
+                )
+            except Exception as e:
+                logging.exception(f"Diarization error: {e}")
+                if os.path.exists(audio_input.local_audio_path) and audio_input.should_delete_local_audio_file:
+                    try:
+                        os.remove(audio_input.local_audio_path)
+                        logging.info(f"Deleted temporary file: {audio_input.local_audio_path}")
+                    except Exception as cleanup_error:
+                        logging.warning(f"Cleanup failed: {cleanup_error}")
+                sys.exit(1)
+            if audio_hash is not None:
+                save_cached_diarization(audio_hash, diarization_segments, args.num_speakers)
     
         logging.debug(f"Diarization Segments Before Mapping: {diarization_segments}")  # Added back the debug line
     
         # Map speakers to unique identifiers for clarity in outputs
         speakers = map_speakers(diarization_segments)
+
+        # Track processed segments by index in an in-memory bitmap
+        processed_segments = Bitmap(len(diarization_segments))
     
         # Instantiate the Metadata and Transcript objects
         metadata = Metadata(
@@ -447,18 +503,6 @@ def main():
             transcript=transcript
         )
     
-        total_duration = len(audio_array) / SAMPLING_RATE  
-        whisper_cost, diarization_cost, total_cost = calculate_cost(
-            total_duration, config.api_costs.whisper_cost_per_minute, config.api_costs.pyannote_cost_per_hour
-        )
-    
-        # Handle dry-run option to estimate costs without actual processing
-        if args.dry_run:
-            print(f"Estimated cost: ${total_cost:.4f} USD")
-            sys.exit(0)
-    
-        logging.info(f"Processing cost: Whisper=${whisper_cost:.4f}, Diarization=${diarization_cost:.4f}, Total=${total_cost:.4f}")
-    
         # Initial transcription with in-memory processed_segments
         transcription_segments, failed_segments = transcribe_segments(
             diarization_segments=diarization_segments,
@@ -486,7 +530,7 @@ def main():
         for speaker in speakers:
             transcription_doc.transcript.speakers.append(
                 Speaker(
-                    id=speaker['id'],
+                    id=format_speaker_id(speaker['id']),
                     name=speaker.get('name'),
                 )
             )
@@ -494,8 +538,7 @@ def main():
         # Add segments
         for segment in transcription_segments:
             # Get the language code, preferring ISO 639-1 (2-letter code)
-            lang_obj = Lang(segment['language']) if segment.get('language') else None
-            language_code = lang_obj.pt1 if lang_obj else None
+            language_code = _lang_to_pt1(segment.get('language'))
             
             words = [
                 Word(
@@ -510,7 +553,7 @@ def main():
                 start=segment['start'],
                 end=segment['end'],
                 text=segment['text'],
-                speaker_id=segment.get('speaker_id'),
+                speaker_id=format_speaker_id(segment.get('speaker_id')),
                 confidence=segment.get('confidence'),
                 language=language_code,  # Now passing just the 2-letter code
                 words=words,
@@ -525,10 +568,7 @@ def main():
             for failed_segment in failed_segments:
                 logging.warning(f"Failed segment: {failed_segment}")
     
-        # Recalculate costs if retries were attempted
-        whisper_cost, diarization_cost, total_cost = calculate_cost(
-            total_duration, config.api_costs.whisper_cost_per_minute, config.api_costs.pyannote_cost_per_hour
-        )
+        # Costs depend only on the duration, so the estimate computed up front still holds
         print(f"\nTotal Duration: {total_duration:.2f}s")
         print(f"Transcription Cost: ${whisper_cost:.4f} USD")
         print(f"Diarization Cost: ${diarization_cost:.4f} USD")
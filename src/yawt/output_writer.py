@@ -1,10 +1,15 @@
 import json
 import os
 import logging
-import srt
-from datetime import timedelta
+import re
+import concurrent.futures
 from stjlib import StandardTranscriptionJSON
 
+try:
+    import orjson  # Optional C-accelerated JSON encoder
+except ImportError:
+    orjson = None
+
 def ensure_directory_exists(file_path):
     """
     Ensure that the directory for the given file path exists.
@@ -18,17 +23,132 @@ def ensure_directory_exists(file_path):
         os.makedirs(directory)
         logging.info(f"Created directory: {directory}")
 
+def write_json(data, f):
+    """
+    Writes data as indented UTF-8 JSON to an open text file.
+
+    Uses orjson when it is installed and falls back to the standard json module otherwise.
+
+    Args:
+        data: JSON-serializable data.
+        f: A file object opened in text mode.
+    """
+    if orjson is not None:
+        try:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8'))
+            return
+        except TypeError as e:
+            # orjson is stricter than json (e.g. non-string keys); let json handle those
+            logging.debug(f"orjson could not serialize data, falling back to json: {e}")
+    json.dump(data, f, indent=2, ensure_ascii=False)
+
+_BLANK_LINES = re.compile(r'\n\n+')
+
+def format_srt_timestamp(seconds):
+    """
+    Formats a time in seconds as an SRT timestamp (HH:MM:SS,mmm).
+
+    Like the srt library, the time is rounded to whole microseconds and then truncated to milliseconds.
+
+    Args:
+        seconds (float): Time in seconds.
+
+    Returns:
+        str: The SRT timestamp.
+    """
+    ms = int(round(seconds * 1_000_000)) // 1000
+    h, r = divmod(ms, 3_600_000)
+    m, r = divmod(r, 60_000)
+    s, ms = divmod(r, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+def iter_srt_blocks(segments, speakers):
+    """
+    Lazily yields SRT blocks for the given segments.
+
+    Args:
+        segments (list): STJ segments to convert.
+        speakers (dict): Mapping of speaker IDs to display names.
+
+    Yields:
+        str: One SRT block per segment, numbered from 1.
+    """
+    for i, seg in enumerate(segments, 1):
+        speaker_name = speakers.get(seg.speaker_id, seg.speaker_id or '')
+        content = f"{speaker_name}: {seg.text}" if speaker_name else seg.text
+        if not content or content[0] == '\n' or '\n\n' in content:
+            # Blank lines would end the block early, so drop them
+            content = _BLANK_LINES.sub('\n', content.strip('\n'))
+        yield f"{i}\n{format_srt_timestamp(seg.start)} --> {format_srt_timestamp(seg.end)}\n{content}\n\n"
+
+def _write_text(base_name, segments, speakers):
+    """
+    Writes the plain-text transcription.
+
+    Returns:
+        str or None: Path of the written file, or None if writing failed.
+    """
+    text_file = f"{base_name}.txt"
+    try:
+        with open(text_file, 'w', encoding='utf-8') as f:
+            for seg in segments:
+                speaker_name = speakers.get(seg.speaker_id, seg.speaker_id or '')
+                f.write(f"[{seg.start:.2f} - {seg.end:.2f}] {speaker_name}: {seg.text}\n")
+        logging.info(f"Text transcription saved to {text_file}")
+        return text_file
+    except Exception as e:
+        logging.error(f"Failed to write text file: {e}")
+        return None
+
+def _write_srt(base_name, segments, speakers):
+    """
+    Writes the SRT subtitles.
+
+    Returns:
+        str or None: Path of the written file, or None if writing failed.
+    """
+    srt_file = f"{base_name}.srt"
+    try:
+        with open(srt_file, 'w', encoding='utf-8') as f:
+            # Write each block as it is composed instead of building one large string
+            for block in iter_srt_blocks(segments, speakers):
+                f.write(block)
+        logging.info(f"SRT transcription saved to {srt_file}")
+        return srt_file
+    except Exception as e:
+        logging.error(f"Failed to write SRT file: {e}")
+        return None
+
+def _write_stj(base_name, transcription_doc):
+    """
+    Writes the Standard Transcription JSON document.
+
+    Returns:
+        str or None: Path of the written file, or None if writing failed.
+    """
+    stj_file = f"{base_name}.stjson"
+    try:
+        # Convert to dictionary and write as JSON
+        stj_data = transcription_doc.to_dict()
+        with open(stj_file, 'w', encoding='utf-8') as f:
+            write_json({"stj": stj_data}, f)
+        logging.info(f"STJ transcription saved to {stj_file}")
+        return stj_file
+    except Exception as e:
+        logging.error(f"Failed to write STJ file: {e}")
+        return None
+
 def write_transcriptions(output_format, base_name, transcription_doc: StandardTranscriptionJSON):
     """
     Writes transcriptions to the specified formats.
+
+    The requested formats are independent and I/O-bound, so they are written concurrently.
     
     Args:
-        output_format (list): List of desired output formats ('text', 'json', 'srt').
+        output_format (list): List of desired output formats ('text', 'stj', 'srt').
         base_name (str): Base name for the output files.
         transcription_doc (StandardTranscriptionJSON): The STJ instance to extract data from.
     """
-    output_files = []  # Initialize a list to keep track of generated output files
-    
     # Ensure base_name is an absolute path
     base_name = os.path.abspath(base_name)
     
@@ -39,53 +159,22 @@ def write_transcriptions(output_format, base_name, transcription_doc: StandardTr
     speakers = {speaker.id: speaker.name or speaker.id for speaker in transcription_doc.transcript.speakers}
     segments = transcription_doc.transcript.segments
 
-    # Generate Text Output
+    writers = []
     if 'text' in output_format:
-        text_file = f"{base_name}.txt"
-        try:
-            with open(text_file, 'w', encoding='utf-8') as f:
-                for seg in segments:
-                    speaker_name = speakers.get(seg.speaker_id, seg.speaker_id or '')
-                    f.write(f"[{seg.start:.2f} - {seg.end:.2f}] {speaker_name}: {seg.text}\n")
-            logging.info(f"Text transcription saved to {text_file}")
-            output_files.append(text_file)
-        except Exception as e:
-            logging.error(f"Failed to write text file: {e}")
-
-    # Generate SRT Output
+        writers.append((_write_text, (base_name, segments, speakers)))
     if 'srt' in output_format:
-        srt_file = f"{base_name}.srt"
-        try:
-            subtitles = []
-            for i, seg in enumerate(segments, 1):
-                speaker_name = speakers.get(seg.speaker_id, seg.speaker_id or '')
-                content = f"{speaker_name}: {seg.text}" if speaker_name else seg.text
-                subtitle = srt.Subtitle(
-                    index=i,
-                    start=timedelta(seconds=seg.start),
-                    end=timedelta(seconds=seg.end),
-                    content=content
-                )
-                subtitles.append(subtitle)
-            with open(srt_file, 'w', encoding='utf-8') as f:
-                f.write(srt.compose(subtitles))
-            logging.info(f"SRT transcription saved to {srt_file}")
-            output_files.append(srt_file)
-        except Exception as e:
-            logging.error(f"Failed to write SRT file: {e}")
-
-    # Generate STJ Output
+        writers.append((_write_srt, (base_name, segments, speakers)))
     if 'stj' in output_format:
-        stj_file = f"{base_name}.stjson"
-        try:
-            # Convert to dictionary and write as JSON
-            stj_data = transcription_doc.to_dict()
-            with open(stj_file, 'w', encoding='utf-8') as f:
-                json.dump({"stj": stj_data}, f, indent=2, ensure_ascii=False)
-            logging.info(f"STJ transcription saved to {stj_file}")
-            output_files.append(stj_file)
-        except Exception as e:
-            logging.error(f"Failed to write STJ file: {e}")
+        writers.append((_write_stj, (base_name, transcription_doc)))
+
+    if not writers:
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(writers)) as executor:
+        futures = [executor.submit(writer, *writer_args) for writer, writer_args in writers]
+        # Collect in submission order so the printed list is stable
+        output_files = [future.result() for future in futures]
+    output_files = [file for file in output_files if file]
 
     if output_files:
         # If any output files were generated, print a list of them with full paths
@@ -134,4 +223,4 @@ class STJWriter:
         }
         
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(stj_data, f, indent=2, ensure_ascii=False)
+            write_json(stj_data, f)
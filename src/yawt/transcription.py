@@ -1,10 +1,17 @@
 # transcription.py
 
+import atexit
 import logging
+import os
+import threading
+import contextlib
+from collections import OrderedDict
+from functools import lru_cache
 import concurrent.futures
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Sequence, FrozenSet, Union
 import torch
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, WhisperProcessor
+from transformers.modeling_outputs import BaseModelOutput
 from tqdm import tqdm
 from yawt.config import SAMPLING_RATE
 import torch.nn.functional as F
@@ -12,7 +19,7 @@ import numpy as np
 from iso639 import iter_langs, Lang
 from yawt.exceptions import ModelLoadError  # Import the custom exception
 from tenacity import retry, stop_after_attempt, wait_exponential, RetryError
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import tenacity
 from yawt.constants import (
     MODEL_RETURN_DICT_IN_GENERATE,
@@ -21,10 +28,29 @@ from yawt.constants import (
     WHISPER_LARGE_V3,
     WHISPER_LARGE_V3_TURBO,
     MODEL_SETTINGS,
+    QUANTIZATION_NONE,
+    QUANTIZATION_INT8_DYNAMIC,
+    QUANTIZATION_INT4_HQQ,
+    QUANTIZATION_INT8,
+    QUANTIZATION_INT4,
+    QUANTIZATION_BITSANDBYTES,
+    QUANTIZATION_MODES,
+    INDUCTOR_CACHE_DIRECTORY,
 )
 
 # Define constants
 DEFAULT_MAX_NEW_TOKENS = 256  # Maximum number of new tokens to generate during model inference
+MIN_ACCEPTABLE_CONFIDENCE = 0.3  # Results below this confidence are retried
+ENCODER_CACHE_MAX_ENTRIES = 32  # About 4 MB of device memory per entry for large-v3 in float16
+WHISPER_WINDOW_SECONDS = 30.0  # Whisper pads or truncates every input to this length
+
+# Long-lived workers, created once rather than per call:
+# generate() runs on its own thread so it can be timed out, and the next batch's
+# features are computed in the background while the current one generates
+_GENERATE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="yawt-generate")
+_PREFETCH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="yawt-prefetch")
+atexit.register(_GENERATE_EXECUTOR.shutdown)
+atexit.register(_PREFETCH_EXECUTOR.shutdown)
 
 class TimeoutException(Exception):
     """
@@ -32,6 +58,31 @@ class TimeoutException(Exception):
     """
     pass
 
+def run_with_timeout(fn: Any, timeout: float, *args: Any) -> Any:
+    """
+    Runs `fn(*args)` on the persistent generate worker and waits at most `timeout` seconds for it.
+
+    A call that timed out earlier cannot be interrupted and keeps the single worker busy until
+    it finishes; the timeout therefore starts only once this job is actually running, so the
+    wait behind a stuck call does not turn into a chain of false timeouts.
+
+    Raises:
+        TimeoutException: If `fn` runs longer than `timeout` seconds.
+    """
+    started = threading.Event()
+
+    def run() -> Any:
+        started.set()
+        return fn(*args)
+
+    future = _GENERATE_EXECUTOR.submit(run)
+    started.wait()
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        logging.error("Transcription timed out.")
+        raise TimeoutException("Transcription timed out.")
+
 def get_device() -> torch.device:
     """
     Determines the available device for computation: CUDA, MPS, or CPU.
@@ -46,6 +97,22 @@ def get_device() -> torch.device:
     else:
         return torch.device("cpu")
 
+def get_torch_dtype(device: torch.device) -> torch.dtype:
+    """
+    Selects the inference dtype for the given device.
+
+    Ampere and newer CUDA GPUs (compute capability >= 8.0) use bfloat16, other
+    accelerators use float16 and CPU stays in float32.
+
+    Returns:
+        torch.dtype: The dtype to load and run the model in.
+    """
+    if device.type == "cuda" and torch.cuda.get_device_capability(device)[0] >= 8:
+        return torch.bfloat16
+    if device.type in ["cuda", "mps"]:
+        return torch.float16
+    return torch.float32
+
 # Define ModelConfig dataclass
 @dataclass
 class ModelConfig:
@@ -55,13 +122,209 @@ class ModelConfig:
     torch_dtype: torch.dtype
     batch_size: int
     chunk_length_s: float
+    quantization: str = QUANTIZATION_NONE
+    backend: Optional[Any] = None  # Non-transformers backend (see yawt.backends); model and processor are then None
+
+def _replace_linear_with_hqq(module: torch.nn.Module, quant_config: Any, compute_dtype: torch.dtype, device: torch.device) -> None:
+    """
+    Recursively replaces every nn.Linear under `module` with an HQQLinear layer.
+    """
+    from hqq.core.quantize import HQQLinear
+
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear):
+            setattr(module, name, HQQLinear(
+                child,
+                quant_config=quant_config,
+                compute_dtype=compute_dtype,
+                device=str(device),
+                del_orig=True
+            ))
+        else:
+            _replace_linear_with_hqq(child, quant_config, compute_dtype, device)
+
+def quantize_model(model: AutoModelForSpeechSeq2Seq, quantization: str, device: torch.device, torch_dtype: torch.dtype) -> Tuple[AutoModelForSpeechSeq2Seq, str]:
+    """
+    Applies weight quantization to the loaded model.
+
+    Args:
+        model: The loaded transcription model.
+        quantization (str): One of QUANTIZATION_MODES.
+        device (torch.device): The device the model runs on.
+        torch_dtype (torch.dtype): The compute dtype of the model.
+
+    Returns:
+        Tuple[model, str]: The (possibly) quantized model and the quantization mode actually applied.
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization mode: {quantization}")
+
+    if quantization == QUANTIZATION_INT8_DYNAMIC:
+        # Dynamic int8 kernels are only implemented for CPU inference
+        if device.type != "cpu":
+            logging.warning(f"int8_dynamic quantization is only supported on CPU; keeping {torch_dtype} weights on {device}.")
+            return model, QUANTIZATION_NONE
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logging.info("Applied dynamic int8 quantization to Linear layers.")
+        return model, quantization
+
+    if quantization == QUANTIZATION_INT4_HQQ:
+        try:
+            from hqq.core.quantize import BaseQuantizeConfig
+        except ImportError:
+            logging.warning("int4_hqq quantization requested but the 'hqq' package is not installed; skipping quantization.")
+            return model, QUANTIZATION_NONE
+        quant_config = BaseQuantizeConfig(nbits=4, group_size=64)
+        _replace_linear_with_hqq(model, quant_config, torch_dtype, device)
+        logging.info("Applied int4 HQQ quantization to Linear layers.")
+        return model, quantization
+
+    if quantization in QUANTIZATION_BITSANDBYTES:
+        logging.warning(f"{quantization} quantization is applied while loading (see get_bitsandbytes_config); skipping.")
+
+    return model, QUANTIZATION_NONE
+
+def get_bitsandbytes_config(quantization: str, device: torch.device, torch_dtype: torch.dtype) -> Optional[Any]:
+    """
+    Builds the load-time bitsandbytes config for the "int8" and "int4" quantization modes.
+
+    Args:
+        quantization (str): One of QUANTIZATION_MODES.
+        device (torch.device): The device the model will run on.
+        torch_dtype (torch.dtype): The compute dtype for dequantized matmuls.
+
+    Returns:
+        BitsAndBytesConfig or None: The config to pass to from_pretrained, or None if
+        the mode is not a bitsandbytes mode or bitsandbytes cannot be used here.
+    """
+    if quantization not in QUANTIZATION_BITSANDBYTES:
+        return None
+    if device.type != "cuda":
+        logging.warning(f"{quantization} quantization requires CUDA; keeping {torch_dtype} weights on {device}.")
+        return None
+    try:
+        import bitsandbytes  # noqa: F401
+        from transformers import BitsAndBytesConfig
+    except ImportError:
+        logging.warning(f"{quantization} quantization requested but the 'bitsandbytes' package is not installed; skipping quantization.")
+        return None
+
+    if quantization == QUANTIZATION_INT8:
+        return BitsAndBytesConfig(load_in_8bit=True)
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype=torch_dtype,
+        bnb_4bit_quant_type="nf4"
+    )
+
+def select_attn_implementation(device: torch.device) -> str:
+    """
+    Selects the fused attention kernel for half-precision inference.
+
+    FlashAttention-2 is used on Ampere and newer CUDA GPUs when the flash-attn package
+    is installed; everything else uses PyTorch's scaled_dot_product_attention.
+
+    Returns:
+        str: The `attn_implementation` value to pass to from_pretrained().
+    """
+    if device.type == "cuda" and torch.cuda.get_device_capability(device)[0] >= 8:
+        try:
+            from transformers.utils import is_flash_attn_2_available
+        except ImportError:
+            return "sdpa"
+        if is_flash_attn_2_available():
+            return "flash_attention_2"
+    return "sdpa"
+
+def enable_compile_cache(cache_directory: str = INDUCTOR_CACHE_DIRECTORY) -> None:
+    """
+    Persists TorchInductor's compiled FX graphs across runs in a stable cache directory.
+
+    The default cache lives under the system temp directory, which is often cleared.
+    Values already set in the environment take precedence. CUDA graphs are still
+    captured again in every process; only the compilation itself is reused.
 
-def load_and_optimize_model(model_id: str) -> ModelConfig:
+    Args:
+        cache_directory: Where to store compiled graphs.
+    """
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_directory)
+    try:
+        import torch._inductor.config as inductor_config
+        # The env var is only read when inductor's config is first imported
+        inductor_config.fx_graph_cache = os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] == "1"
+    except ImportError:
+        logging.debug("TorchInductor is unavailable; compiled graphs will not be cached.")
+
+def compile_forward_with_static_cache(
+    model: AutoModelForSpeechSeq2Seq,
+    processor: WhisperProcessor,
+    device: torch.device,
+    torch_dtype: torch.dtype,
+    batch_size: int = 1
+) -> bool:
+    """
+    Compiles `model.forward` against a static KV cache and captures it with a warmup generate().
+
+    A static cache keeps decoder shapes fixed across steps, so the CUDA graphs recorded by
+    mode="reduce-overhead" are captured once and replayed instead of recompiling per length.
+    The warmup runs on the generate worker thread at the batched-pass batch size, because
+    CUDA graph trees and inference mode are per-thread and the cache is sized per batch.
+    If compilation or the warmup fails, the eager forward and dynamic cache are restored.
+
+    Args:
+        model: The loaded transcription model.
+        processor: The matching Whisper processor.
+        device: The device the model lives on.
+        torch_dtype: The model's dtype.
+        batch_size: The number of rows the batched pass decodes at once.
+
+    Returns:
+        bool: True if the compiled forward is in use, False if the model was left eager.
+    """
+    eager_forward = model.forward
+    previous_cache_implementation = getattr(model.generation_config, "cache_implementation", None)
+    try:
+        model.generation_config.cache_implementation = "static"
+        model.forward = torch.compile(eager_forward, mode="reduce-overhead", fullgraph=True)
+
+        # Warm up at the longest decode we request so the cache is never reallocated later
+        silence = [np.zeros(SAMPLING_RATE, dtype=np.float32)] * batch_size
+        features = processor.feature_extractor(silence, sampling_rate=SAMPLING_RATE, return_tensors="pt")
+        input_features = features["input_features"].to(device, dtype=torch_dtype)
+
+        def warmup() -> None:
+            # Same thread and settings as model_generate_with_timeout, so its calls replay these graphs
+            with torch.inference_mode(), inference_autocast(device, torch_dtype):
+                model.generate(
+                    input_features=input_features,
+                    max_new_tokens=DEFAULT_MAX_NEW_TOKENS,
+                    return_dict_in_generate=MODEL_RETURN_DICT_IN_GENERATE,
+                    output_scores=MODEL_OUTPUT_SCORES,
+                    use_cache=MODEL_USE_CACHE
+                )
+
+        # No timeout: the first compilation can take minutes
+        _GENERATE_EXECUTOR.submit(warmup).result()
+        return True
+    except Exception as e:
+        logging.warning(f"Static-cache compilation failed, using the eager forward: {e}")
+        model.forward = eager_forward
+        model.generation_config.cache_implementation = previous_cache_implementation
+        return False
+
+def load_and_optimize_model(
+    model_id: str,
+    quantization: str = QUANTIZATION_NONE,
+    compile_model: bool = False
+) -> ModelConfig:
     """
     Loads and optimizes the speech-to-text model.
 
     Args:
         model_id (str): The identifier for the model to load.
+        quantization (str): Weight quantization mode, one of QUANTIZATION_MODES. Defaults to "none".
+        compile_model (bool): Whether to compile the model with torch.compile. Defaults to False.
 
     Returns:
         ModelConfig: The loaded transcription model.
@@ -69,7 +332,7 @@ def load_and_optimize_model(model_id: str) -> ModelConfig:
     try:
         logging.info(f"Loading model '{model_id}'...")
         device = get_device()
-        torch_dtype = torch.float16 if device.type in ["cuda", "mps"] else torch.float32
+        torch_dtype = get_torch_dtype(device)
 
         # Try loading with WhisperProcessor directly
         try:
@@ -99,20 +362,29 @@ def load_and_optimize_model(model_id: str) -> ModelConfig:
         # attn_implementation supported from 4.28.0 and requires PyTorch 2.0+
         if version >= (4, 28, 0) and torch.__version__ >= "2.0.0":
             if torch_dtype in [torch.float16, torch.bfloat16]:
-                model_args["attn_implementation"] = "sdpa"
+                model_args["attn_implementation"] = select_attn_implementation(device)
+                logging.info(f"Using {model_args['attn_implementation']} attention implementation")
             else:
                 logging.info("Using default attention implementation due to full precision mode")
 
+        # bitsandbytes quantizes while loading and places the weights itself
+        bnb_config = get_bitsandbytes_config(quantization, device, torch_dtype)
+        if bnb_config is not None:
+            model_args["quantization_config"] = bnb_config
+            model_args["device_map"] = {"": device.index or 0}
+
         logging.debug(f"Loading model with args: {model_args}")
         model = AutoModelForSpeechSeq2Seq.from_pretrained(
             model_id,
             **model_args
-        ).to(device)
+        )
 
-        # Convert model to half precision if on CUDA or MPS for performance
-        if device.type in ["cuda", "mps"] and model.dtype != torch.float16:
-            model = model.half()
-            logging.info("Converted model to float16.")
+        if bnb_config is None:
+            model = model.to(device)
+            # Convert model to half precision if on CUDA or MPS for performance
+            if device.type in ["cuda", "mps"] and model.dtype != torch_dtype:
+                model = model.to(torch_dtype)
+                logging.info(f"Converted model to {torch_dtype}.")
 
         logging.info(f"Model loaded on {device} with dtype {model.dtype}.")
 
@@ -121,18 +393,36 @@ def load_and_optimize_model(model_id: str) -> ModelConfig:
         warnings.filterwarnings("ignore", category=FutureWarning, module="transformers.modeling_utils")
         warnings.filterwarnings("ignore", category=UserWarning, module="transformers.models.whisper.modeling_whisper")
 
-        # Attempt to optimize the model using torch.compile for better performance
-        try:
-            model = torch.compile(model, mode="reduce-overhead")
-            logging.info("Model optimized with torch.compile.")
-        except Exception as e:
-            logging.warning(f"Failed to optimize model with torch.compile: {e}")
-
         # Retrieve model settings based on model_id
         model_settings = MODEL_SETTINGS.get(model_id)
         if not model_settings:
             raise ValueError(f"Unsupported model_id: {model_id}")
 
+        if bnb_config is not None:
+            logging.info(f"Loaded {quantization} bitsandbytes-quantized weights.")
+        else:
+            # Quantize weights before compiling so the compiled graph sees the final modules
+            model, quantization = quantize_model(model, quantization, device, torch_dtype)
+
+        if compile_model and bnb_config is None:
+            enable_compile_cache()
+
+        if compile_model and bnb_config is not None:
+            logging.info("Skipping compilation: bitsandbytes layers are not supported by torch.compile.")
+        elif compile_model:
+            # Attempt to optimize the model using torch.compile for better performance
+            try:
+                if device.type == "cuda":
+                    if compile_forward_with_static_cache(model, processor, device, torch_dtype, model_settings["batch_size"]):
+                        logging.info("Model forward compiled against a static KV cache.")
+                else:
+                    model = torch.compile(model, mode="reduce-overhead")
+                    logging.info("Model optimized with torch.compile.")
+            except Exception as e:
+                logging.warning(f"Failed to optimize model with torch.compile: {e}")
+        else:
+            logging.info("Model compilation disabled.")
+
         batch_size = model_settings["batch_size"]
         chunk_length_s = model_settings["chunk_length_s"]
 
@@ -144,7 +434,8 @@ def load_and_optimize_model(model_id: str) -> ModelConfig:
             device=device,
             torch_dtype=torch_dtype,
             batch_size=batch_size,
-            chunk_length_s=chunk_length_s
+            chunk_length_s=chunk_length_s,
+            quantization=quantization
         )
 
     except FileNotFoundError as fnf_error:
@@ -157,20 +448,101 @@ def load_and_optimize_model(model_id: str) -> ModelConfig:
         logging.exception(f"An unexpected error occurred while loading the model: {e}")
         raise ModelLoadError("Failed to load and optimize the model.") from e
 
+def transfer_to_device(tensor: torch.Tensor, device: torch.device, dtype: Optional[torch.dtype] = None) -> torch.Tensor:
+    """
+    Moves a host tensor to `device` (and optionally `dtype`) in a single copy.
+
+    On CUDA the tensor is cast on the host first, so a half-precision copy moves half the
+    bytes. Tensors that are already pinned (e.g. by the batch prefetcher) are copied
+    asynchronously; others take the plain copy rather than paying for a pinned allocation.
+
+    Args:
+        tensor: The CPU tensor to move.
+        device: The target device.
+        dtype: Optional target dtype.
+
+    Returns:
+        The tensor on `device`.
+    """
+    if device.type == "cuda":
+        if dtype is not None:
+            tensor = tensor.to(dtype)
+        return tensor.to(device, non_blocking=tensor.is_pinned())
+    return tensor.to(device, dtype=dtype)
+
+class DeviceInputBuffer:
+    """
+    Reusable device tensor for a stream of same-shaped inputs, such as successive mel chunks.
+
+    On CUDA each input is cast into a pinned host staging tensor and copied asynchronously into
+    the device tensor; both are allocated once and reallocated only when the shape changes.
+    On other devices inputs are moved with a plain `.to()`, which is free when nothing changes.
+    """
+    def __init__(self, device: torch.device, dtype: torch.dtype):
+        self.device = device
+        self.dtype = dtype
+        self._host: Optional[torch.Tensor] = None
+        self._buffer: Optional[torch.Tensor] = None
+        self._copied: Optional[Any] = None  # CUDA event marking the end of the last host-to-device copy
+
+    def copy(self, tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Copies a host tensor into the buffer, casting it to the buffer's dtype.
+
+        Returns:
+            The tensor on `device`. On CUDA it is the shared buffer, overwritten by the next call.
+        """
+        if self.device.type != "cuda":
+            return tensor.to(self.device, dtype=self.dtype)
+        if self._buffer is None or self._buffer.shape != tensor.shape:
+            self._host = torch.empty(tensor.shape, dtype=self.dtype, pin_memory=True)
+            self._buffer = torch.empty(tensor.shape, dtype=self.dtype, device=self.device)
+            self._copied = None
+        if self._copied is not None:
+            self._copied.synchronize()  # The previous copy may still be reading the staging tensor
+        self._host.copy_(tensor)
+        self._buffer.copy_(self._host, non_blocking=True)
+        self._copied = torch.cuda.Event()
+        self._copied.record()
+        return self._buffer
+
+def inference_autocast(device: torch.device, torch_dtype: torch.dtype):
+    """
+    Returns an autocast context for reduced-precision inference on CUDA.
+
+    Args:
+        device: The device the inputs live on.
+        torch_dtype: The reduced-precision dtype to autocast to.
+
+    Returns:
+        A context manager; a no-op on non-CUDA devices or in full precision.
+    """
+    if device.type == "cuda" and torch_dtype in (torch.float16, torch.bfloat16):
+        return torch.autocast(device_type="cuda", dtype=torch_dtype)
+    return contextlib.nullcontext()
+
 def model_generate_with_timeout(
     model: AutoModelForSpeechSeq2Seq,
     inputs: Dict[str, torch.Tensor],
     generate_kwargs: Dict[str, Any],
-    transcription_timeout: int
+    transcription_timeout: int,
+    encoder_cache: Optional["EncoderCache"] = None,
+    cache_key: Optional[Tuple[int, int]] = None
 ) -> Any:
     """
     Generates output from the model with a timeout.
 
+    With an `encoder_cache` and `cache_key`, the encoder output is looked up (or computed) in
+    the same worker job as generate(), so a hung encoder is covered by the timeout too and never
+    runs alongside a generate() call that is still stuck from an earlier timeout.
+
     Args:
         model: The transcription model.
         inputs: The input tensor dictionary.
         generate_kwargs: Generation keyword arguments.
         transcription_timeout: Timeout for transcription in seconds.
+        encoder_cache: Optional cache of encoder outputs to decode from.
+        cache_key: The audio sample range `inputs` encodes, used as the cache key.
 
     Returns:
         GenerateOutput: Generated token sequences and scores.
@@ -180,89 +552,198 @@ def model_generate_with_timeout(
     """
     def generate() -> Any:
         # Add necessary generation parameters
-        adjusted_kwargs = generate_kwargs.copy()
-        adjusted_kwargs['input_features'] = inputs['input_features']
-        adjusted_kwargs['return_dict_in_generate'] = MODEL_RETURN_DICT_IN_GENERATE  # Ensure detailed output
-        adjusted_kwargs['output_scores'] = MODEL_OUTPUT_SCORES                      # Include scores
-        logging.debug(f"Final generate_kwargs before generation: {adjusted_kwargs}")
-        return model.generate(**adjusted_kwargs, use_cache=MODEL_USE_CACHE)
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(generate)
+        adjusted_kwargs = {
+            **generate_kwargs,
+            'return_dict_in_generate': MODEL_RETURN_DICT_IN_GENERATE,  # Ensure detailed output
+            'output_scores': MODEL_OUTPUT_SCORES                       # Include scores
+        }
+        if encoder_cache is not None and cache_key is not None:
+            # Decoding the same audio again (a retry) skips the encoder forward pass
+            adjusted_kwargs['encoder_outputs'] = BaseModelOutput(
+                last_hidden_state=encoder_cache.get_or_encode(cache_key, model, inputs['input_features'])
+            )
+        if 'encoder_outputs' not in adjusted_kwargs:
+            # Whisper rejects mel features alongside precomputed encoder outputs
+            adjusted_kwargs['input_features'] = inputs['input_features']
+        if logging.getLogger().isEnabledFor(logging.DEBUG):  # Skip formatting large tensors otherwise
+            logging.debug(f"Final generate_kwargs before generation: {adjusted_kwargs}")
+        # Grad and autocast state are thread-local, so they must be set inside the worker thread
+        input_features = inputs['input_features']
+        # Whisper's generate() switches the model to eager attention for token timestamps and
+        # never switches back; restore it here, where the call actually ends even after a timeout
+        config = model.config
+        attn_implementation = getattr(config, '_attn_implementation', None)
         try:
-            return future.result(timeout=transcription_timeout)
-        except concurrent.futures.TimeoutError:
-            logging.error("Transcription timed out.")
-            raise TimeoutException("Transcription timed out.")
+            with torch.inference_mode(), inference_autocast(input_features.device, input_features.dtype):
+                return model.generate(**adjusted_kwargs, use_cache=MODEL_USE_CACHE)
+        finally:
+            if adjusted_kwargs.get('return_token_timestamps') and attn_implementation is not None:
+                config._attn_implementation = attn_implementation
+
+    return run_with_timeout(generate, transcription_timeout)
 
-def compute_per_token_confidence(outputs: Any) -> List[float]:
+def top_token_probabilities(scores: Sequence[torch.Tensor]) -> torch.Tensor:
     """
-    Computes per-token confidence scores from model outputs.
+    Stacks the top-token probability of every generation step into a [T, B] tensor.
+
+    Each step is reduced on its device before stacking, so the result needs a single
+    host sync and never materializes a [T, B, V] copy of the logits.
 
     Args:
-        outputs: The GenerateOutput object from model.generate().
+        scores: Per-step logits from generate(), each of shape [B, V].
 
     Returns:
-        List of per-token confidence scores.
-    """
-    if hasattr(outputs, 'scores'):
-        token_confidences = []
-        for score in outputs.scores:
-            probabilities = F.softmax(score, dim=-1)
-            top_prob, _ = torch.max(probabilities, dim=-1)
-            token_confidences.extend(top_prob.tolist())
-        return token_confidences
-    else:
+        Tensor of shape [T, B] with the highest softmax probability per step and row.
+    """
+    return torch.stack([F.softmax(score, dim=-1).max(dim=-1).values for score in scores])
+
+def _output_field(outputs: Any, name: str) -> Any:
+    """
+    Reads a field of a generate() output, or None if it is missing.
+
+    With `return_token_timestamps=True`, Whisper's generate() returns a plain dict rather than
+    a ModelOutput; ModelOutput is a dict too, so key access covers both.
+    """
+    if isinstance(outputs, dict):
+        return outputs.get(name)
+    return getattr(outputs, name, None)
+
+def compute_batch_token_confidences(outputs: Any, eos_token_id: Optional[int]) -> List[List[float]]:
+    """
+    Computes per-token confidence scores for every row of a batched generate() output.
+
+    Rows that emit EOS early keep receiving padding steps while the rest of the batch
+    finishes; those steps are excluded so each row's confidence matches an unbatched run.
+
+    Args:
+        outputs: The GenerateOutput object from a batched model.generate().
+        eos_token_id: The tokenizer's end-of-sequence token id.
+
+    Returns:
+        List of per-token confidence lists, one per batch row.
+    """
+    sequences = _output_field(outputs, 'sequences')
+    scores = _output_field(outputs, 'scores')
+    batch_size = sequences.shape[0]
+    if scores is None:
         logging.warning("Output does not contain scores. Returning full confidence.")
-        # If scores are not available, return full confidence
-        return [1.0] * outputs.sequences.shape[1]
+        return [[1.0] * sequences.shape[1] for _ in range(batch_size)]
 
-def aggregate_confidence(token_confidences: List[float]) -> float:
+    steps = len(scores)
+    if steps == 0:
+        return [[] for _ in range(batch_size)]
+    top_probs = top_token_probabilities(scores).transpose(0, 1)  # [B, T]
+    if eos_token_id is None:
+        return top_probs.tolist()
+
+    # Keep every step up to and including a row's first EOS
+    is_eos = (sequences[:, -steps:] == eos_token_id).int()
+    row_lengths = ((is_eos.cumsum(dim=1) - is_eos) == 0).sum(dim=1)
+    return [row[:length] for row, length in zip(top_probs.tolist(), row_lengths.tolist())]
+
+def aggregate_confidence(token_confidences: Union[List[float], torch.Tensor]) -> float:
     """
     Aggregates per-token confidence scores into an overall confidence score.
 
     Args:
-        token_confidences: List of per-token confidence scores.
+        token_confidences: Per-token confidence scores, as a list or a tensor. A tensor
+            is averaged on its device and read back with a single sync.
 
     Returns:
         The average confidence score.
     """
+    if isinstance(token_confidences, torch.Tensor):
+        if token_confidences.numel() == 0:
+            return 0.0
+        return token_confidences.float().mean().item()
     if not token_confidences:
         return 0.0
     overall_confidence = sum(token_confidences) / len(token_confidences)
     return overall_confidence
 
-# Create a set of valid language codes
-valid_codes = set()
-for lang in iter_langs():
-    if lang.pt1:
-        valid_codes.add(lang.pt1.lower())  # ISO 639-1 codes
-    if lang.pt2b:
-        valid_codes.add(lang.pt2b.lower())  # ISO 639-2/B codes
-    if lang.pt2t:
-        valid_codes.add(lang.pt2t.lower())  # ISO 639-2/T codes
-    if lang.pt3:
-        valid_codes.add(lang.pt3.lower())  # ISO 639-3 codes
-    valid_codes.add(lang.name.lower())  # Language names (lowercase)
+@lru_cache(maxsize=1)
+def _valid_codes() -> FrozenSet[str]:
+    """
+    Builds the set of recognized language codes and names on first use.
+    """
+    codes = set()
+    for lang in iter_langs():
+        if lang.pt1:
+            codes.add(lang.pt1.casefold())  # ISO 639-1 codes
+        if lang.pt2b:
+            codes.add(lang.pt2b.casefold())  # ISO 639-2/B codes
+        if lang.pt2t:
+            codes.add(lang.pt2t.casefold())  # ISO 639-2/T codes
+        if lang.pt3:
+            codes.add(lang.pt3.casefold())  # ISO 639-3 codes
+        codes.add(lang.name.casefold())  # Language names
+    return frozenset(codes)
 
 def is_valid_language_code(code: str) -> bool:
-    return code.lower() in valid_codes
+    return code.casefold() in _valid_codes()
+
+def language_token_ids(tokenizer: Any) -> Dict[int, str]:
+    """
+    Maps the tokenizer's Whisper language token IDs (e.g. `<|en|>`) to language codes.
+
+    The map is built once from the tokenizer's added vocabulary and memoized on the tokenizer.
+    """
+    language_ids = vars(tokenizer).get('_yawt_language_ids')
+    if language_ids is None:
+        language_ids = {}
+        for token, token_id in tokenizer.get_added_vocab().items():
+            if token.startswith('<|') and token.endswith('|>') and is_valid_language_code(token[2:-2]):
+                language_ids[token_id] = token[2:-2]
+        tokenizer._yawt_language_ids = language_ids
+    return language_ids
 
 def extract_language_token(generated_ids: torch.Tensor, tokenizer: Any) -> Optional[str]:
-    tokens = tokenizer.convert_ids_to_tokens(generated_ids.cpu().flatten().tolist())
+    token_ids = generated_ids.flatten()[:5].tolist()  # Check only the first few tokens
 
-    logging.debug(f"Generated tokens: {tokens}")
+    logging.debug(f"Generated token IDs: {token_ids}")
 
-    for token in tokens[:5]:  # Check only the first few tokens
-        if token.startswith('<|') and token.endswith('|>'):
-            lang_code = token[2:-2]  # Remove '<|' and '|>'
-            if is_valid_language_code(lang_code):
-                return lang_code
-        elif token != '<|startoftranscript|>':
+    language_ids = language_token_ids(tokenizer)
+    for token_id in token_ids:
+        lang_code = language_ids.get(token_id)
+        if lang_code is not None:
+            return lang_code
+        if token_id < tokenizer.eos_token_id:  # Whisper's special tokens all follow <|endoftext|>
             break
 
     return None
 
+class EncoderCache:
+    """
+    Bounded LRU cache of Whisper encoder outputs, keyed by the audio sample range they encode.
+
+    Retried decodes of the same audio (in `transcribe_with_retry` and `retry_transcriptions`)
+    reuse the cached encoder output instead of running the encoder forward pass again.
+    """
+    def __init__(self, max_entries: int = ENCODER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], torch.Tensor]" = OrderedDict()
+
+    def get_or_encode(self, key: Tuple[int, int], model: Any, input_features: torch.Tensor) -> torch.Tensor:
+        """
+        Returns the encoder's last hidden state for `key`, encoding `input_features` on a miss.
+
+        The cache is not locked; `model_generate_with_timeout` calls this on the generate worker,
+        under the transcription timeout, which also keeps every access on that one thread.
+        """
+        last_hidden_state = self._entries.get(key)
+        if last_hidden_state is not None:
+            self._entries.move_to_end(key)
+            return last_hidden_state
+        with torch.inference_mode(), inference_autocast(input_features.device, input_features.dtype):
+            last_hidden_state = model.get_encoder()(input_features).last_hidden_state
+        self._entries[key] = last_hidden_state
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)  # Evict the least recently used window
+        return last_hidden_state
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 @dataclass
 class ModelResources:
     model: AutoModelForSpeechSeq2Seq
@@ -272,6 +753,10 @@ class ModelResources:
     generate_kwargs: Dict[str, Any]
     batch_size: int
     chunk_length_s: float
+    quantization: str = QUANTIZATION_NONE
+    backend: Optional[Any] = None  # Non-transformers backend (see yawt.backends)
+    encoder_cache: Optional[EncoderCache] = None  # Encoder outputs reused when a window is decoded again
+    generate_kwargs_cache: Dict[Tuple, Dict[str, Any]] = field(default_factory=dict, repr=False, compare=False)
 
 @dataclass
 class TranscriptionConfig:
@@ -281,11 +766,57 @@ class TranscriptionConfig:
     confidence_threshold: float
     context_prompt: Optional[str] = None  # Store context prompt in config
     overlap_duration: float = 2.0        # Added overlap duration attribute
+    pack_segments: bool = False          # Decode short segments together in shared 30s windows
+
+def _ids_to_device(input_ids: torch.Tensor, device: torch.device) -> torch.Tensor:
+    # Token ids stay int64; on CUDA they are pinned so the copy runs asynchronously with other GPU work
+    input_ids = input_ids.long()
+    if device.type == "cuda":
+        return input_ids.pin_memory().to(device, non_blocking=True)
+    return input_ids.to(device)
 
 def prepare_input_ids(context, tokenizer, device):
-    # Encode the context and ensure the tensor is of type Long
-    input_ids = tokenizer.encode(context, return_tensors='pt').to(device).long()
-    return input_ids
+    # Encode the context and move the int64 ids to the device
+    return _ids_to_device(tokenizer.encode(context, return_tensors='pt'), device)
+
+def generate_kwargs_template(
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str,
+    input_length: int
+) -> Dict[str, Any]:
+    """
+    Returns the generate() keyword arguments for single-row decoding in `main_language`.
+
+    The forced decoder IDs, the tokenized context prompt and the token budget only depend on
+    the arguments, so they are built once per combination and memoized on `model_resources`.
+    The returned dict is shared: callers must copy it before changing it.
+
+    Args:
+        model_resources: The model resources whose `generate_kwargs` are the base.
+        config: The transcription config providing the context prompt and token limits.
+        main_language: The language to decode in.
+        input_length: `input_features.shape[1]`, which counts against the token budget.
+
+    Returns:
+        Dict[str, Any]: The generate() keyword arguments.
+    """
+    key = (main_language, config.context_prompt, input_length, config.max_target_positions, config.buffer_tokens)
+    generate_kwargs = model_resources.generate_kwargs_cache.get(key)
+    if generate_kwargs is None:
+        processor = model_resources.processor
+        generate_kwargs = model_resources.generate_kwargs.copy()
+        generate_kwargs["forced_decoder_ids"] = processor.get_decoder_prompt_ids(language=main_language, task="transcribe")
+        if config.context_prompt:
+            generate_kwargs["decoder_input_ids"] = prepare_input_ids(config.context_prompt, processor.tokenizer, model_resources.device)
+
+        decoder_input_ids = generate_kwargs.get("decoder_input_ids")
+        prompt_length = decoder_input_ids.shape[-1] if decoder_input_ids is not None else 0
+        remaining_length = config.max_target_positions - input_length - prompt_length - config.buffer_tokens - 1
+        max_new_tokens = max(min(DEFAULT_MAX_NEW_TOKENS, remaining_length), 1)
+        generate_kwargs["max_new_tokens"] = min(generate_kwargs.get("max_new_tokens", max_new_tokens), max_new_tokens)
+        model_resources.generate_kwargs_cache[key] = generate_kwargs
+    return generate_kwargs
 
 def transcribe_single_segment(
     idx: int,
@@ -294,17 +825,13 @@ def transcribe_single_segment(
     inputs: Dict[str, torch.Tensor],
     model_resources: ModelResources,
     config: TranscriptionConfig,
-    main_language: str  # Now mandatory
+    main_language: str,  # Now mandatory
+    cache_key: Optional[Tuple[int, int]] = None
 ) -> Tuple[Optional[str], float, Optional[str], Optional[torch.Tensor]]:
     try:
         model = model_resources.model
         processor = model_resources.processor
-        device = model_resources.device
-        torch_dtype = model_resources.torch_dtype
-        generate_kwargs = model_resources.generate_kwargs.copy()
         transcription_timeout = config.transcription_timeout
-        max_target_positions = config.max_target_positions
-        buffer_tokens = config.buffer_tokens
 
         # Assert batch size is 1
         assert inputs['input_features'].shape[0] == 1, f"Batch size must be 1, got {inputs['input_features'].shape[0]}"
@@ -316,77 +843,26 @@ def transcribe_single_segment(
             if isinstance(tensor, torch.Tensor):
                 assert tensor.shape[0] == 1, f"Batch size for {key} must be 1, got {tensor.shape[0]}"
 
-        adjusted_generate_kwargs = generate_kwargs.copy()
-        # adjusted_generate_kwargs["language"] = main_language
+        # Shared per language and prompt; model_generate_with_timeout copies it, so it is never mutated here
+        adjusted_generate_kwargs = generate_kwargs_template(model_resources, config, main_language, inputs['input_features'].shape[1])
 
-        forced_decoder_ids = processor.get_decoder_prompt_ids(language=main_language, task="transcribe")
-        adjusted_generate_kwargs["forced_decoder_ids"] = forced_decoder_ids
-
-        input_length = inputs['input_features'].shape[1]
-
-        # Add detailed debug logging for model config
-        logging.debug(f"Segment {idx}: Model config type: {type(model.config)}")
-        logging.debug(f"Segment {idx}: Model config attributes: {dir(model.config)}")
-        
-        # Check max_length in model config
-        if hasattr(model.config, 'max_length'):
-            logging.debug(f"Segment {idx}: Direct max_length from config: {model.config.max_length}")
-        
-        # Check decoder config
-        if hasattr(model.config, 'decoder'):
-            logging.debug(f"Segment {idx}: Decoder config type: {type(model.config.decoder)}")
-            logging.debug(f"Segment {idx}: Decoder config attributes: {dir(model.config.decoder)}")
-            if hasattr(model.config.decoder, 'max_length'):
-                logging.debug(f"Segment {idx}: Decoder max_length: {model.config.decoder.max_length}")
-        
-        # Check max_target_positions
-        logging.debug(f"Segment {idx}: max_target_positions from config: {max_target_positions}")
-
-        # Updated max_length retrieval with logging
-        max_length = max_target_positions
-        logging.debug(f"Segment {idx}: Using max_target_positions: {max_length} (fixed value)")
-
-        prompt_length = adjusted_generate_kwargs.get('decoder_input_ids', torch.tensor([], device=device, dtype=torch_dtype)).shape[-1]
-
-        # Add debug prints
-        logging.debug(f"Segment {idx}: input_length = {input_length}")
-        logging.debug(f"Segment {idx}: prompt_length = {prompt_length}")
-        logging.debug(f"Segment {idx}: buffer_tokens = {buffer_tokens}")
-        logging.debug(f"Segment {idx}: Calculation: {max_length} - {input_length} - {prompt_length} - {buffer_tokens} - 1")
-        
-        remaining_length = max_length - input_length - prompt_length - buffer_tokens - 1
-        max_new_tokens = min(DEFAULT_MAX_NEW_TOKENS, remaining_length)
-        max_new_tokens = max(max_new_tokens, 1)
-        
-        logging.debug(f"Segment {idx}: remaining_length before min/max = {remaining_length}")
-        logging.debug(f"Segment {idx}: DEFAULT_MAX_NEW_TOKENS = {DEFAULT_MAX_NEW_TOKENS}")
-        logging.debug(f"Segment {idx}: final max_new_tokens = {max_new_tokens}")
-
-        adjusted_generate_kwargs["max_new_tokens"] = min(
-            adjusted_generate_kwargs.get("max_new_tokens", max_new_tokens),
-            max_new_tokens
-        )
-
-        logging.debug(f"Segment {idx}: Input features shape: {inputs['input_features'].shape}")
-        logging.debug(f"Segment {idx}: Generate kwargs: {adjusted_generate_kwargs}")
-
-        # Prepare decoder_input_ids with correct dtype
-        decoder_input_ids = prepare_input_ids(config.context_prompt, processor.tokenizer, device) if config.context_prompt else None
-
-        if decoder_input_ids is not None:
-            adjusted_generate_kwargs["decoder_input_ids"] = decoder_input_ids  # Ensure decoder_input_ids are integers and passed to model.generate
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Segment {idx}: Model config type: {type(model.config)}")
+            logging.debug(f"Segment {idx}: max_target_positions from config: {config.max_target_positions}")
+            logging.debug(f"Segment {idx}: Input features shape: {inputs['input_features'].shape}")
+            logging.debug(f"Segment {idx}: Generate kwargs: {adjusted_generate_kwargs}")
 
         with torch.no_grad():  # Disable gradient computation during inference
             outputs = model_generate_with_timeout(
                 model=model,
                 inputs=inputs,
                 generate_kwargs=adjusted_generate_kwargs,
-                transcription_timeout=transcription_timeout
+                transcription_timeout=transcription_timeout,
+                encoder_cache=model_resources.encoder_cache,
+                cache_key=cache_key
             )
 
-        # Debug logging for outputs
         logging.debug(f"Segment {idx}: Type of outputs: {type(outputs)}")
-        logging.debug(f"Segment {idx}: Outputs attributes: {dir(outputs)}")
 
         # Ensure outputs have 'sequences' and 'scores'
         if hasattr(outputs, 'sequences') and hasattr(outputs, 'scores'):
@@ -395,8 +871,8 @@ def transcribe_single_segment(
             assert outputs.sequences.ndim == 2, f"Expected 2D tensor for output sequences, got {outputs.sequences.ndim}D"
 
             transcription = processor.batch_decode(outputs.sequences, skip_special_tokens=True)[0].strip()
-            token_confidences = compute_per_token_confidence(outputs)
-            overall_confidence = aggregate_confidence(token_confidences)
+            # Average on the device; only the final mean is copied back to the host
+            overall_confidence = aggregate_confidence(top_token_probabilities(outputs.scores)) if outputs.scores else 0.0
             language_token = extract_language_token(outputs.sequences, processor.tokenizer)
             generated_sequence = outputs.sequences[0]
         else:
@@ -416,6 +892,245 @@ def transcribe_single_segment(
         logging.exception(f"Unexpected error during transcription of segment {idx}: {e}")
         raise
 
+def extract_batch_features(chunks: List[np.ndarray], feature_extractor: Any) -> torch.Tensor:
+    """
+    Computes the log-mel input features for a batch of audio chunks on the CPU.
+
+    The feature extractor pads every chunk to the 30s window, so rows stack cleanly.
+
+    Args:
+        chunks: Audio arrays, each at most one Whisper window long.
+        feature_extractor: The processor's feature extractor.
+
+    Returns:
+        Tensor of shape [B, n_mels, 3000].
+    """
+    features = feature_extractor(chunks, sampling_rate=SAMPLING_RATE, return_tensors="pt", return_attention_mask=False)
+    return features['input_features']
+
+def _batch_generate_kwargs(
+    input_features: torch.Tensor,
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str
+) -> Dict[str, Any]:
+    """
+    Builds the generate() keyword arguments shared by every row of a batched call.
+    """
+    generate_kwargs = dict(generate_kwargs_template(model_resources, config, main_language, input_features.shape[1]))
+    decoder_input_ids = generate_kwargs.get("decoder_input_ids")
+    if decoder_input_ids is not None:
+        generate_kwargs["decoder_input_ids"] = decoder_input_ids.expand(input_features.shape[0], -1)
+    return generate_kwargs
+
+def transcribe_batch(
+    chunks: List[np.ndarray],
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str,
+    input_features: Optional[torch.Tensor] = None
+) -> List[Tuple[Optional[str], float, Optional[str], Optional[torch.Tensor]]]:
+    """
+    Transcribes several audio chunks with a single batched generate() call.
+
+    Args:
+        chunks: Audio arrays to transcribe, each at most one Whisper window long.
+        model_resources: Model, processor and generation settings.
+        config: Transcription settings.
+        main_language: Language to force during decoding.
+        input_features: Precomputed CPU features for `chunks` (see extract_batch_features).
+            Computed here when omitted.
+
+    Returns:
+        One (transcription, confidence, language, sequence) tuple per chunk, in input order.
+    """
+    model = model_resources.model
+    processor = model_resources.processor
+    device = model_resources.device
+    batch_size = len(chunks)
+
+    if input_features is None:
+        input_features = extract_batch_features(chunks, processor.feature_extractor)
+    inputs = {'input_features': transfer_to_device(input_features, device, model_resources.torch_dtype)}
+    generate_kwargs = _batch_generate_kwargs(inputs['input_features'], model_resources, config, main_language)
+
+    logging.debug(f"Batch of {batch_size}: Input features shape: {inputs['input_features'].shape}")
+
+    with torch.no_grad():
+        outputs = model_generate_with_timeout(
+            model=model,
+            inputs=inputs,
+            generate_kwargs=generate_kwargs,
+            transcription_timeout=config.transcription_timeout
+        )
+
+    if not hasattr(outputs, 'sequences'):
+        logging.error(f"Batch of {batch_size}: Unexpected output format")
+        return [(None, 0.0, None, None)] * batch_size
+
+    transcriptions = processor.batch_decode(outputs.sequences, skip_special_tokens=True)
+    row_confidences = compute_batch_token_confidences(outputs, processor.tokenizer.eos_token_id)
+
+    results = []
+    for row in range(batch_size):
+        language_token = extract_language_token(outputs.sequences[row:row + 1], processor.tokenizer)
+        results.append((
+            transcriptions[row].strip(),
+            aggregate_confidence(row_confidences[row]),
+            language_token,
+            outputs.sequences[row]
+        ))
+    return results
+
+def transcribe_with_backend(
+    backend: Any,
+    chunk: np.ndarray,
+    config: TranscriptionConfig,
+    main_language: str
+) -> Tuple[str, float, Optional[str]]:
+    """
+    Transcribes one audio chunk with a non-transformers backend, with the usual timeout.
+
+    Args:
+        backend: A TranscriptionBackend (see yawt.backends).
+        chunk: Audio to transcribe.
+        config: Transcription settings.
+        main_language: Language to decode in.
+
+    Returns:
+        Tuple of (transcription, confidence, language).
+
+    Raises:
+        TimeoutException: If transcription exceeds the configured timeout.
+    """
+    return run_with_timeout(backend.transcribe, config.transcription_timeout, chunk, main_language, config.context_prompt)
+
+def pack_segments(segments: List[Dict[str, Any]], max_window_s: float = WHISPER_WINDOW_SECONDS) -> List[List[int]]:
+    """
+    Groups consecutive segments into windows that each span at most `max_window_s`.
+
+    Args:
+        segments: Segments with 'start' and 'end' keys, in chronological order.
+        max_window_s: Maximum span of a window in seconds.
+
+    Returns:
+        One list of positions into `segments` per window, in order. A segment longer
+        than `max_window_s` gets a window of its own.
+    """
+    windows = []
+    current = []
+    window_start = 0.0
+    for position, segment in enumerate(segments):
+        if current and segment['end'] - window_start <= max_window_s:
+            current.append(position)
+            continue
+        if current:
+            windows.append(current)
+        current = [position]
+        window_start = segment['start']
+    if current:
+        windows.append(current)
+    return windows
+
+def split_window_tokens(
+    tokens: List[int],
+    token_times: List[float],
+    token_confidences: List[float],
+    segment_starts: List[float],
+    tokenizer: Any
+) -> List[Tuple[str, float]]:
+    """
+    Attributes the tokens decoded for a packed window back to the segments it contains.
+
+    Each token goes to the last segment that starts at or before the token's timestamp.
+
+    Args:
+        tokens: Generated token ids for the window.
+        token_times: Per-token timestamps in seconds, relative to the window start.
+        token_confidences: Per-token confidences; tokens past the end of this list are ignored.
+        segment_starts: Segment start times relative to the window start, ascending.
+        tokenizer: The Whisper tokenizer.
+
+    Returns:
+        One (text, confidence) tuple per segment.
+    """
+    count = min(len(tokens), len(token_times), len(token_confidences))
+    owners = np.searchsorted(np.asarray(segment_starts), np.asarray(token_times[:count]), side='right') - 1
+    owners = np.clip(owners, 0, len(segment_starts) - 1).tolist()
+
+    segment_tokens = [[] for _ in segment_starts]
+    segment_confidences = [[] for _ in segment_starts]
+    for token, owner, confidence in zip(tokens[:count], owners, token_confidences[:count]):
+        # Whisper's special and timestamp tokens all come after <|endoftext|>
+        if token >= tokenizer.eos_token_id:
+            continue
+        segment_tokens[owner].append(token)
+        segment_confidences[owner].append(confidence)
+
+    return [
+        (tokenizer.decode(token_ids, skip_special_tokens=True).strip(), aggregate_confidence(confidences))
+        for token_ids, confidences in zip(segment_tokens, segment_confidences)
+    ]
+
+def transcribe_packed_windows(
+    chunks: List[np.ndarray],
+    segment_starts: List[List[float]],
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str
+) -> List[List[Tuple[str, float, Optional[str]]]]:
+    """
+    Transcribes packed windows in one batched generate() call and splits the text by segment.
+
+    Args:
+        chunks: One audio array per window, each at most one Whisper window long.
+        segment_starts: For each window, its segments' start times relative to the window start.
+        model_resources: Model, processor and generation settings.
+        config: Transcription settings.
+        main_language: Language to force during decoding.
+
+    Returns:
+        For each window, one (transcription, confidence, language) tuple per segment.
+
+    Raises:
+        ValueError: If the model does not return token timestamps.
+    """
+    processor = model_resources.processor
+    # Token timestamps are only reliable when generate() knows where each window's audio ends
+    features = processor.feature_extractor(chunks, sampling_rate=SAMPLING_RATE, return_tensors="pt", return_attention_mask=True)
+    inputs = {'input_features': transfer_to_device(features['input_features'], model_resources.device, model_resources.torch_dtype)}
+    generate_kwargs = _batch_generate_kwargs(inputs['input_features'], model_resources, config, main_language)
+    generate_kwargs["attention_mask"] = transfer_to_device(features['attention_mask'], model_resources.device)
+    generate_kwargs["return_token_timestamps"] = True
+
+    outputs = model_generate_with_timeout(
+        model=model_resources.model,
+        inputs=inputs,
+        generate_kwargs=generate_kwargs,
+        transcription_timeout=config.transcription_timeout
+    )
+
+    sequences = _output_field(outputs, 'sequences')
+    scores = _output_field(outputs, 'scores')
+    token_timestamps = _output_field(outputs, 'token_timestamps')
+    if token_timestamps is None or not scores:
+        raise ValueError("generate() did not return token timestamps and scores")
+
+    # Sequences and timestamps are right-aligned, so the last `steps` columns are the generated tokens
+    steps = len(scores)
+    generated_tokens = sequences[:, -steps:].tolist()
+    token_times = token_timestamps[:, -steps:].tolist()
+    row_confidences = compute_batch_token_confidences(outputs, processor.tokenizer.eos_token_id)
+
+    results = []
+    for row, starts in enumerate(segment_starts):
+        language_token = extract_language_token(sequences[row:row + 1], processor.tokenizer)
+        segment_results = split_window_tokens(
+            generated_tokens[row], token_times[row], row_confidences[row], starts, processor.tokenizer
+        )
+        results.append([(text, confidence, language_token) for text, confidence in segment_results])
+    return results
+
 def evaluate_confidence(
     overall_confidence: float,
     language_token: Optional[str],
@@ -431,11 +1146,9 @@ def evaluate_confidence(
     if language_token is None:
         is_main_language = False
     else:
-        if not is_valid_language_code(language_token) or not is_valid_language_code(main_language):
-            logging.warning(f"Unrecognized language code: {language_token} or {main_language}")
-            is_main_language = False
-        else:
-            is_main_language = language_token.lower() == main_language.lower()
+        # Compare first: only a matching code needs the validity lookup
+        language = language_token.casefold()
+        is_main_language = language == main_language.casefold() and language in _valid_codes()
 
     logging.debug(f"Confidence evaluation: Overall confidence: {overall_confidence}, Detected Language: {language_token}, Main Language: {main_language}")
     logging.debug(f"Evaluation result: High confidence: {is_high_confidence}, Is main language: {is_main_language}")
@@ -449,7 +1162,8 @@ def transcribe_with_retry(
     inputs: Dict[str, torch.Tensor],
     model_resources: ModelResources,
     config: TranscriptionConfig,
-    main_language: str
+    main_language: str,
+    cache_key: Optional[Tuple[int, int]] = None
 ) -> Tuple[Optional[str], float, Optional[str], Optional[torch.Tensor]]:
     """Custom retry implementation without tenacity"""
     
@@ -467,12 +1181,13 @@ def transcribe_with_retry(
                 inputs=inputs,
                 model_resources=model_resources,
                 config=config,
-                main_language=main_language
+                main_language=main_language,
+                cache_key=cache_key
             )
 
             if result is not None:
                 transcription, confidence, language, tokens = result
-                if transcription and confidence >= 0.3:
+                if transcription and confidence >= MIN_ACCEPTABLE_CONFIDENCE:
                     logging.debug(f"TRANSCRIBE - Segment {idx}: Successful transcription with confidence {confidence:.3f}")
                     return result
                 else:
@@ -493,7 +1208,7 @@ def transcribe_with_retry(
             continue
 
     # If we get here, we've exhausted all attempts
-    if last_result is not None and last_result[1] >= 0.3:
+    if last_result is not None and last_result[1] >= MIN_ACCEPTABLE_CONFIDENCE:
         logging.warning(f"TRANSCRIBE - Segment {idx}: Using last obtained result with confidence {last_result[1]:.3f}")
         return last_result
     else:
@@ -513,7 +1228,7 @@ def chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right,
         sampling_rate: Audio sampling rate
     
     Yields:
-        Dict containing processed chunk data
+        Dict containing processed chunk data and the chunk's sample offset within `inputs`
     """
     inputs_len = inputs.shape[0]
     chunk_start_idx = 0
@@ -535,7 +1250,7 @@ def chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right,
         if len(chunk) == 0:
             break
             
-        processed = feature_extractor(chunk, sampling_rate=sampling_rate, return_tensors="pt")
+        processed = feature_extractor(chunk, sampling_rate=sampling_rate, return_tensors="pt", return_attention_mask=False)
         
         # Adjust strides for first and last chunks
         _stride_left = stride_left if chunk_start_idx != 0 else 0
@@ -546,7 +1261,7 @@ def chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right,
         stride = (chunk_len_actual, _stride_left, _stride_right)
         
         if chunk_len_actual > _stride_left:
-            yield {"is_last": is_last, "stride": stride, **processed}
+            yield {"is_last": is_last, "stride": stride, "offset": chunk_start_idx, **processed}
 
         # Calculate next chunk start position
         increment = chunk_len - _stride_left - _stride_right
@@ -555,6 +1270,13 @@ def chunk_iter(inputs, feature_extractor, chunk_len, stride_left, stride_right,
         
         logging.debug(f"Chunk progress - Start: {chunk_start_idx}, End: {chunk_end_idx}, Increment: {increment}")
 
+def chunk_cache_key(window_start: float, chunk_data: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Returns the absolute sample range of a `chunk_iter` chunk, for keying the encoder cache.
+    """
+    start_sample = int(window_start * SAMPLING_RATE) + chunk_data['offset']
+    return start_sample, start_sample + chunk_data['stride'][0]
+
 def merge_sequences(sequences):
     if not sequences:
         return []
@@ -575,97 +1297,259 @@ def merge_sequences(sequences):
             merged_sequence.extend(next_sequence)
     return merged_sequence
 
+class Bitmap:
+    """
+    Fixed-size set of segment indices backed by a bytearray, one bit per index.
+
+    Supports the `add` / `in` subset of the set API used to track processed segments.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self._bits = bytearray(size // 8 + 1)
+
+    def add(self, index: int) -> None:
+        if not 0 <= index < self.size:
+            raise IndexError(f"Bitmap index {index} out of range for size {self.size}")
+        self._bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, index: int) -> bool:
+        return 0 <= index < self.size and bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count('1') for byte in self._bits)
+
+def _transcribe_chunk_sequentially(
+    idx: int,
+    chunk: np.ndarray,
+    adjusted_start: float,
+    adjusted_end: float,
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str,
+    mel_buffer: DeviceInputBuffer
+) -> Tuple[str, float, Optional[str]]:
+    """
+    Transcribes a single segment chunk-by-chunk with retries and merges the overlapping sequences.
+
+    `mel_buffer` is shared by the caller across segments, so its device and pinned host
+    tensors are allocated once per run rather than once per segment.
+    """
+    # Calculate chunk parameters with dynamic adjustment
+    chunk_length_s = adjusted_end - adjusted_start
+    stride_length_s = min(config.overlap_duration, chunk_length_s / 4)  # Limit stride to 1/4 of chunk length
+
+    chunk_len_samples = int(chunk_length_s * SAMPLING_RATE)
+    stride_left_samples = int(stride_length_s * SAMPLING_RATE)
+    stride_right_samples = int(stride_length_s * SAMPLING_RATE)
+
+    logging.debug(f"Segment {idx} parameters - Length: {chunk_length_s:.2f}s, "
+                f"Stride: {stride_length_s:.2f}s, "
+                f"Samples: {chunk_len_samples}")
+
+    sequences = []
+    overall_confidences = []
+    language_tokens = []
+
+    for chunk_data in chunk_iter(
+        inputs=chunk,
+        feature_extractor=model_resources.processor.feature_extractor,
+        chunk_len=chunk_len_samples,
+        stride_left=stride_left_samples,
+        stride_right=stride_right_samples,
+        sampling_rate=SAMPLING_RATE
+    ):
+        # Every chunk is padded to the same window, so one device buffer is reused for all of them
+        inputs = {'input_features': mel_buffer.copy(chunk_data['input_features'])}
+        transcription, overall_confidence, language_token, generated_sequence = transcribe_with_retry(
+            idx=idx,
+            chunk_start=adjusted_start,
+            chunk_end=adjusted_end,
+            inputs=inputs,
+            model_resources=model_resources,
+            config=config,
+            main_language=main_language,
+            cache_key=chunk_cache_key(adjusted_start, chunk_data)
+        )
+        if transcription is not None and generated_sequence is not None:
+            sequences.append(generated_sequence)
+            overall_confidences.append(overall_confidence)
+            language_tokens.append(language_token)
+
+    # Merge overlapping sequences
+    if sequences:
+        merged_sequence = merge_sequences(sequences)
+        transcription = model_resources.processor.decode(merged_sequence, skip_special_tokens=True).strip()
+        overall_confidence = np.mean(overall_confidences)
+        language_token = language_tokens[0] if language_tokens else None
+    else:
+        transcription = ""
+        overall_confidence = 0.0
+        language_token = None
+
+    return transcription, overall_confidence, language_token
+
+def _transcribe_packed_segments(
+    pending_segments: List[Tuple[int, Dict[str, Any], Any, float, float]],
+    audio_array: np.ndarray,
+    model_resources: ModelResources,
+    config: TranscriptionConfig,
+    main_language: str,
+    batch_size: int
+) -> Dict[int, Tuple[str, float, Optional[str], None]]:
+    """
+    Transcribes runs of short segments together, one Whisper window per run.
+
+    Returns:
+        Results keyed by segment index for the segments that came back with usable text;
+        the rest are left to the per-segment passes.
+    """
+    windows = [window for window in pack_segments([pending[1] for pending in pending_segments]) if len(window) > 1]
+    results = {}
+    for batch_start in tqdm(range(0, len(windows), batch_size), desc="Transcribing packed windows"):
+        batch = windows[batch_start:batch_start + batch_size]
+        chunks = []
+        segment_starts = []
+        for window in batch:
+            window_start = pending_segments[window[0]][1]['start']
+            window_end = max(pending_segments[position][1]['end'] for position in window)
+            chunks.append(audio_array[int(window_start * SAMPLING_RATE):int(window_end * SAMPLING_RATE)].astype(np.float32, copy=False))
+            segment_starts.append([pending_segments[position][1]['start'] - window_start for position in window])
+        try:
+            window_results = transcribe_packed_windows(chunks, segment_starts, model_resources, config, main_language)
+        except Exception as e:
+            logging.warning(f"Packed transcription of {len(batch)} windows failed, falling back to per-segment batches: {e}")
+            continue
+        for window, segment_results in zip(batch, window_results):
+            for position, (transcription, overall_confidence, language_token) in zip(window, segment_results):
+                if transcription and overall_confidence >= MIN_ACCEPTABLE_CONFIDENCE:
+                    results[pending_segments[position][0]] = (transcription, overall_confidence, language_token, None)
+
+    logging.info(f"Packed windows covered {len(results)} of {len(pending_segments)} segments.")
+    return results
+
 def transcribe_segments(
     diarization_segments: List[Dict[str, Any]],
     audio_array: np.ndarray,
     model_resources: ModelResources,
     config: TranscriptionConfig,
     main_language: str,
-    processed_segments: Optional[set] = None
+    processed_segments: Optional["Bitmap"] = None,
+    batch_size: Optional[int] = None
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Transcribe audio segments with dynamic stride adjustment for short segments.
+
+    Segments are first transcribed in length-sorted batches of `batch_size` (defaulting to
+    `model_resources.batch_size`); any segment whose batched result is missing or
+    low-confidence falls back to the sequential chunk-by-chunk path with retries.
+    With a non-transformers `model_resources.backend`, each segment is transcribed by it instead.
     """
     if processed_segments is None:
-        processed_segments = set()  # Initialize as empty set within the run
+        processed_segments = Bitmap(len(diarization_segments))  # Indices of segments done within the run
+
+    if not is_valid_language_code(main_language):
+        # Validated once here; no detected language can match it, so every segment is low-confidence
+        logging.warning(f"Unrecognized main language code: {main_language}")
 
     transcription_segments = []
     failed_segments = []
+    audio_duration = audio_array.shape[0] / SAMPLING_RATE
 
-    for idx, segment in enumerate(tqdm(diarization_segments, desc="Transcribing segments"), start=1):
+    # Resolve each segment's audio window up front so that segments can be batched.
+    # A segment starts where the previous transcribed segment ended, to keep the overlap.
+    pending_segments = []
+    previous_end = None
+    for idx, segment in enumerate(diarization_segments, start=1):
         segment_id = (segment['speaker_id'], round(segment['start'], 3), round(segment['end'], 3))
-        if segment_id in processed_segments:
+        if idx - 1 in processed_segments:
             logging.info(f"Segment {idx}: Skipping already processed segment: {segment_id}")
             continue
+        adjusted_start = segment['start'] if previous_end is None else previous_end
+        adjusted_end = min(segment['end'] + config.overlap_duration, audio_duration)
+        pending_segments.append((idx, segment, segment_id, adjusted_start, adjusted_end))
+        previous_end = segment['end']
+
+    # Convert every segment's window to sample indices in one vectorized pass
+    window_seconds = np.array([(pending[3], pending[4]) for pending in pending_segments], dtype=np.float64).reshape(-1, 2)
+    sample_bounds = dict(zip(
+        (pending[0] for pending in pending_segments),
+        (window_seconds * SAMPLING_RATE).astype(np.int64).tolist()
+    ))
+
+    def slice_chunk(idx: int) -> np.ndarray:
+        start_sample, end_sample = sample_bounds[idx]
+        # The feature extractor expects float32; upcasting per slice keeps the full array compact
+        return audio_array[start_sample:end_sample].astype(np.float32, copy=False)
+
+    batched_results = {}
+    batch_size = max(1, batch_size if batch_size is not None else model_resources.batch_size)
+    if config.pack_segments and model_resources.backend is None:
+        batched_results.update(_transcribe_packed_segments(
+            pending_segments, audio_array, model_resources, config, main_language, batch_size
+        ))
+
+    # Batched pass: sort by duration so rows in a batch finish decoding at similar steps
+    by_length = sorted(
+        (pending for pending in pending_segments
+         if model_resources.backend is None and pending[4] > pending[3] and pending[0] not in batched_results),
+        key=lambda pending: pending[4] - pending[3]
+    )
+    batches = [by_length[batch_start:batch_start + batch_size] for batch_start in range(0, len(by_length), batch_size)]
+
+    def prepare_batch(batch):
+        chunks = [slice_chunk(idx) for idx, _, _, _, _ in batch]
+        input_features = extract_batch_features(chunks, model_resources.processor.feature_extractor)
+        if model_resources.device.type == "cuda":
+            # Cast and pin here, off the critical path, so the later host-to-device copy is
+            # asynchronous and moves torch_dtype-sized features
+            input_features = input_features.to(model_resources.torch_dtype).pin_memory()
+        return chunks, input_features
+
+    # Prepare the next batch's features on the CPU while the current batch is generating
+    next_batch = _PREFETCH_EXECUTOR.submit(prepare_batch, batches[0]) if batches else None
+    for batch_index, batch in enumerate(tqdm(batches, desc="Transcribing batches")):
+        prepared = next_batch
+        next_batch = _PREFETCH_EXECUTOR.submit(prepare_batch, batches[batch_index + 1]) if batch_index + 1 < len(batches) else None
+        try:
+            chunks, input_features = prepared.result()
+            results = transcribe_batch(
+                chunks=chunks,
+                model_resources=model_resources,
+                config=config,
+                main_language=main_language,
+                input_features=input_features
+            )
+        except Exception as e:
+            logging.warning(f"Batched transcription of {len(batch)} segments failed, falling back to per-segment transcription: {e}")
+            continue
+        for (idx, _, _, _, _), result in zip(batch, results):
+            transcription, overall_confidence, _, generated_sequence = result
+            if transcription and generated_sequence is not None and overall_confidence >= MIN_ACCEPTABLE_CONFIDENCE:
+                batched_results[idx] = result
+
+    logging.info(f"Batched transcription covered {len(batched_results)} of {len(pending_segments)} segments.")
 
+    mel_buffer = DeviceInputBuffer(model_resources.device, model_resources.torch_dtype)  # Reused across segments
+    for idx, segment, segment_id, adjusted_start, adjusted_end in tqdm(pending_segments, desc="Transcribing segments"):
         logging.debug(f"Segment {idx}: Starting transcription for segment: {segment_id}")
         try:
-            original_start = segment['start']
-            original_end = segment['end']
-
-            # Adjust start and end times with overlap
-            if not transcription_segments:
-                adjusted_start = original_start
+            if idx in batched_results:
+                transcription, overall_confidence, language_token, _ = batched_results[idx]
+            elif model_resources.backend is not None:
+                transcription, overall_confidence, language_token = transcribe_with_backend(
+                    model_resources.backend, slice_chunk(idx), config, main_language
+                )
             else:
-                adjusted_start = transcription_segments[-1]['end']
-
-            adjusted_end = min(original_end + config.overlap_duration, audio_array.shape[0] / SAMPLING_RATE)
-
-            start_sample = int(adjusted_start * SAMPLING_RATE)
-            end_sample = int(adjusted_end * SAMPLING_RATE)
-            chunk = audio_array[start_sample:end_sample]
-
-            # Calculate chunk parameters with dynamic adjustment
-            chunk_length_s = adjusted_end - adjusted_start
-            stride_length_s = min(config.overlap_duration, chunk_length_s / 4)  # Limit stride to 1/4 of chunk length
-            
-            chunk_len_samples = int(chunk_length_s * SAMPLING_RATE)
-            stride_left_samples = int(stride_length_s * SAMPLING_RATE)
-            stride_right_samples = int(stride_length_s * SAMPLING_RATE)
-            
-            logging.debug(f"Segment {idx} parameters - Length: {chunk_length_s:.2f}s, "
-                        f"Stride: {stride_length_s:.2f}s, "
-                        f"Samples: {chunk_len_samples}")
-
-            sequences = []
-            overall_confidences = []
-            language_tokens = []
-
-            for chunk_data in chunk_iter(
-                inputs=chunk,
-                feature_extractor=model_resources.processor.feature_extractor,
-                chunk_len=chunk_len_samples,
-                stride_left=stride_left_samples,
-                stride_right=stride_right_samples,
-                sampling_rate=SAMPLING_RATE
-            ):
-                inputs = {k: v.to(model_resources.device).to(model_resources.torch_dtype) 
-                          for k, v in chunk_data.items() if k not in ['is_last', 'stride']}
-                chunk_stride = chunk_data['stride']
-                transcription, overall_confidence, language_token, generated_sequence = transcribe_with_retry(
+                transcription, overall_confidence, language_token = _transcribe_chunk_sequentially(
                     idx=idx,
-                    chunk_start=adjusted_start,
-                    chunk_end=adjusted_end,
-                    inputs=inputs,
+                    chunk=slice_chunk(idx),
+                    adjusted_start=adjusted_start,
+                    adjusted_end=adjusted_end,
                     model_resources=model_resources,
                     config=config,
-                    main_language=main_language
+                    main_language=main_language,
+                    mel_buffer=mel_buffer
                 )
-                if transcription is not None and generated_sequence is not None:
-                    sequences.append(generated_sequence)
-                    overall_confidences.append(overall_confidence)
-                    language_tokens.append(language_token)
-
-            # Merge overlapping sequences
-            if sequences:
-                merged_sequence = merge_sequences(sequences)
-                transcription = model_resources.processor.decode(merged_sequence, skip_special_tokens=True).strip()
-                overall_confidence = np.mean(overall_confidences)
-                language_token = language_tokens[0] if language_tokens else None
-            else:
-                transcription = ""
-                overall_confidence = 0.0
-                language_token = None
 
             # Evaluate confidence
             low_confidence = overall_confidence < config.confidence_threshold or not evaluate_confidence(
@@ -674,15 +1558,15 @@ def transcribe_segments(
 
             transcript = {
                 'speaker_id': segment['speaker_id'],
-                'start': original_start,
-                'end': original_end,
+                'start': segment['start'],
+                'end': segment['end'],
                 'text': transcription,
                 'confidence': overall_confidence,
                 'language': language_token,
                 'low_confidence': low_confidence
             }
             transcription_segments.append(transcript)
-            processed_segments.add(segment_id)  # Track processed segment
+            processed_segments.add(idx - 1)  # Track processed segment by its diarization index
 
             logging.info(f"Segment {idx}: Successfully transcribed.")
 
@@ -709,7 +1593,6 @@ def retry_transcriptions(
     processor = model_resources.processor
     device = model_resources.device
     torch_dtype = model_resources.torch_dtype
-    generate_kwargs = model_resources.generate_kwargs.copy()
     confidence_threshold = config.confidence_threshold
     sampling_rate = SAMPLING_RATE
 
@@ -729,74 +1612,96 @@ def retry_transcriptions(
     logging.info(f"Starting retry for failed segments with secondary language '{lang}'.")
     logging.info(f"Number of segments to retry: {len(failed_segments)}")
 
+    # Index segments and transcripts by (speaker_id, start, end) once, for O(1) lookups per failure
+    segment_indices = {
+        (segment['speaker_id'], segment['start'], segment['end']): index
+        for index, segment in enumerate(diarization_segments)
+    }
+    transcripts_by_key = {
+        (transcript['speaker_id'], transcript['start'], transcript['end']): transcript
+        for transcript in transcription_segments
+    }
+
     retry_failed_segments = []
+    mel_buffer = DeviceInputBuffer(device, torch_dtype)  # Device-side input features, reused across chunks
     for failure in tqdm(failed_segments, desc="Retrying Segments", unit="segment"):
         logging.debug(f"Starting retry for failed segment: {failure}")
-        idx = failure['segment_index']
+        # transcribe_segments reports the failed segment itself; earlier retries report its index
+        if 'segment_index' in failure:
+            idx = failure['segment_index']
+        else:
+            idx = segment_indices.get((failure['speaker_id'], failure['start'], failure['end']))
+            if idx is None:
+                logging.warning(f"Failed segment not found among diarization segments: {failure}")
+                retry_failed_segments.append(failure)
+                continue
         segment = diarization_segments[idx]
         original_start = segment['start']
         original_end = segment['end']
 
         try:
-            # Adjust start and end times with overlap
-            if not transcription_segments:
-                adjusted_start = segment['start']
-            else:
-                adjusted_start = transcription_segments[-1]['end']
+            # Start where the previous diarization segment ended, as in transcribe_segments
+            adjusted_start = diarization_segments[idx - 1]['end'] if idx > 0 else segment['start']
 
             adjusted_end = min(original_end + config.overlap_duration, audio_array.shape[0] / sampling_rate)
 
             start_sample = int(adjusted_start * sampling_rate)
             end_sample = int(adjusted_end * sampling_rate)
-            chunk = audio_array[start_sample:end_sample]
-
-            # Determine chunk parameters
-            chunk_length_s = adjusted_end - adjusted_start
-            stride_length_s = config.overlap_duration
-
-            # Prepare chunks with overlapping
-            chunk_len_samples = int(chunk_length_s * sampling_rate)
-            stride_left_samples = int(stride_length_s * sampling_rate)
-            stride_right_samples = int(stride_length_s * sampling_rate)
-
-            sequences = []
-            overall_confidences = []
-            language_tokens = []
-
-            for chunk_data in chunk_iter(
-                inputs=chunk,
-                feature_extractor=processor.feature_extractor,
-                chunk_len=chunk_len_samples,
-                stride_left=stride_left_samples,
-                stride_right=stride_right_samples,
-                sampling_rate=sampling_rate
-            ):
-                inputs = {k: v.to(device).to(torch_dtype) for k, v in chunk_data.items() if k != 'is_last' and k != 'stride'}
-                chunk_stride = chunk_data['stride']
-                transcription, overall_confidence, language_token, generated_sequence = transcribe_with_retry(
-                    idx=idx,
-                    chunk_start=adjusted_start,
-                    chunk_end=adjusted_end,
-                    inputs=inputs,
-                    model_resources=current_model_resources,
-                    config=config,
-                    main_language=lang  # Use secondary_language for retries
+            chunk = audio_array[start_sample:end_sample].astype(np.float32, copy=False)
+
+            if model_resources.backend is not None:
+                transcription, overall_confidence, language_token = transcribe_with_backend(
+                    model_resources.backend, chunk, config, lang
                 )
-                if transcription is not None and generated_sequence is not None:
-                    sequences.append(generated_sequence)
-                    overall_confidences.append(overall_confidence)
-                    language_tokens.append(language_token)
-
-            # Merge overlapping sequences
-            if sequences:
-                merged_sequence = merge_sequences(sequences)
-                transcription = processor.decode(merged_sequence, skip_special_tokens=True).strip()
-                overall_confidence = np.mean(overall_confidences)
-                language_token = language_tokens[0] if language_tokens else None
             else:
-                transcription = ""
-                overall_confidence = 0.0
-                language_token = None
+                # Determine chunk parameters
+                chunk_length_s = adjusted_end - adjusted_start
+                stride_length_s = config.overlap_duration
+
+                # Prepare chunks with overlapping
+                chunk_len_samples = int(chunk_length_s * sampling_rate)
+                stride_left_samples = int(stride_length_s * sampling_rate)
+                stride_right_samples = int(stride_length_s * sampling_rate)
+
+                sequences = []
+                overall_confidences = []
+                language_tokens = []
+
+                for chunk_data in chunk_iter(
+                    inputs=chunk,
+                    feature_extractor=processor.feature_extractor,
+                    chunk_len=chunk_len_samples,
+                    stride_left=stride_left_samples,
+                    stride_right=stride_right_samples,
+                    sampling_rate=sampling_rate
+                ):
+                    inputs = {'input_features': mel_buffer.copy(chunk_data['input_features'])}
+                    chunk_stride = chunk_data['stride']
+                    transcription, overall_confidence, language_token, generated_sequence = transcribe_with_retry(
+                        idx=idx,
+                        chunk_start=adjusted_start,
+                        chunk_end=adjusted_end,
+                        inputs=inputs,
+                        model_resources=model_resources,
+                        config=config,
+                        main_language=lang,  # Use secondary_language for retries
+                        cache_key=chunk_cache_key(adjusted_start, chunk_data)
+                    )
+                    if transcription is not None and generated_sequence is not None:
+                        sequences.append(generated_sequence)
+                        overall_confidences.append(overall_confidence)
+                        language_tokens.append(language_token)
+
+                # Merge overlapping sequences
+                if sequences:
+                    merged_sequence = merge_sequences(sequences)
+                    transcription = processor.decode(merged_sequence, skip_special_tokens=True).strip()
+                    overall_confidence = np.mean(overall_confidences)
+                    language_token = language_tokens[0] if language_tokens else None
+                else:
+                    transcription = ""
+                    overall_confidence = 0.0
+                    language_token = None
 
             # Evaluate confidence
             low_confidence = overall_confidence < confidence_threshold or not evaluate_confidence(
@@ -812,7 +1717,13 @@ def retry_transcriptions(
                 'language': language_token,
                 'low_confidence': low_confidence
             }
-            transcription_segments.append(transcript)
+            key = (segment['speaker_id'], original_start, original_end)
+            existing = transcripts_by_key.get(key)
+            if existing is not None:
+                existing.update(transcript)  # Replace the earlier result in place
+            else:
+                transcription_segments.append(transcript)
+                transcripts_by_key[key] = transcript
 
             # Since transcription is successful, do not add to failed_segments
             continue  # Proceed to the next segment
@@ -844,23 +1755,43 @@ def integrate_context_prompt(context_prompt: Optional[str], processor, device, t
         logging.info("Integrating context prompt into transcription.")
         # Tokenize the context prompt without adding special tokens
         prompt_encoded = processor.tokenizer(context_prompt, return_tensors="pt", add_special_tokens=False)
-        # Move the input ids to the specified device and dtype
-        decoder_input_ids = prompt_encoded['input_ids'].to(device).to(torch_dtype).long()
-        return decoder_input_ids
+        return _ids_to_device(prompt_encoded['input_ids'], device)
     return None
 
 # Make sure to export the necessary functions and classes
 __all__ = [
+    'get_device',
+    'get_torch_dtype',
     'load_and_optimize_model',
+    'quantize_model',
+    'get_bitsandbytes_config',
+    'compile_forward_with_static_cache',
+    'enable_compile_cache',
+    'select_attn_implementation',
     'model_generate_with_timeout',
+    'run_with_timeout',
+    'inference_autocast',
+    'transfer_to_device',
+    'DeviceInputBuffer',
     'transcribe_single_segment',
+    'generate_kwargs_template',
     'retry_transcriptions',
     'TimeoutException',
     'extract_language_token',
+    'language_token_ids',
     'is_valid_language_code',
     'ModelResources',
     'TranscriptionConfig',
     'transcribe_segments',
+    'Bitmap',
+    'EncoderCache',
+    'chunk_cache_key',
+    'transcribe_batch',
+    'transcribe_with_backend',
+    'pack_segments',
+    'split_window_tokens',
+    'transcribe_packed_windows',
+    'extract_batch_features',
     'transcribe_with_retry',
     'evaluate_confidence',
     'prepare_input_ids',
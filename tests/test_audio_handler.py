@@ -0,0 +1,82 @@
+import hashlib
+import pytest
+import time
+from unittest.mock import patch, MagicMock
+import ffmpeg
+from yawt.audio_handler import get_audio_duration, compute_audio_hash, upload_file_cached, upload_file, download_audio
+from yawt.constants import DOWNLOAD_CHUNK_SIZE
+
+def test_compute_audio_hash(tmp_path):
+    data = b'\x00\x01' * 5000
+    audio_file = tmp_path / "audio.wav"
+    audio_file.write_bytes(data)
+    assert compute_audio_hash(str(audio_file), chunk_size=1024) == hashlib.sha256(data).hexdigest()
+
+@patch('yawt.audio_handler.ffmpeg.probe')
+def test_get_audio_duration_from_format(mock_probe):
+    mock_probe.return_value = {'format': {'duration': '12.5'}, 'streams': []}
+    assert get_audio_duration('audio.mp3') == pytest.approx(12.5)
+
+@patch('yawt.audio_handler.ffmpeg.probe')
+def test_get_audio_duration_from_streams(mock_probe):
+    mock_probe.return_value = {'format': {}, 'streams': [{'duration': '3.0'}, {'duration': '4.25'}]}
+    assert get_audio_duration('video.webm') == pytest.approx(4.25)
+
+@patch('yawt.audio_handler.ffmpeg.probe')
+def test_get_audio_duration_probe_error(mock_probe):
+    mock_probe.side_effect = ffmpeg.Error('ffprobe', b'', b'invalid data')
+    assert get_audio_duration('broken.wav') is None
+
+@patch('yawt.audio_handler.upload_file')
+def test_upload_file_cached_reuses_previous_upload(mock_upload, tmp_path):
+    mock_upload.return_value = 'https://0x0.st/abc.wav'
+    cache_path = str(tmp_path / "uploads.json")
+
+    first = upload_file_cached('audio.wav', 'deadbeef', cache_path=cache_path)
+    second = upload_file_cached('audio.wav', 'deadbeef', cache_path=cache_path)
+
+    assert first == second == 'https://0x0.st/abc.wav'
+    mock_upload.assert_called_once()
+
+@patch('yawt.audio_handler.upload_file')
+def test_upload_file_cached_expired_entry(mock_upload, tmp_path):
+    mock_upload.side_effect = ['https://0x0.st/old.wav', 'https://0x0.st/new.wav']
+    cache_path = str(tmp_path / "uploads.json")
+
+    upload_file_cached('audio.wav', 'deadbeef', cache_path=cache_path)
+    with patch('yawt.audio_handler.time.time', return_value=time.time() + 2 * 24 * 3600):
+        assert upload_file_cached('audio.wav', 'deadbeef', cache_path=cache_path) == 'https://0x0.st/new.wav'
+    assert mock_upload.call_count == 2
+
+@patch('yawt.audio_handler.upload_file')
+def test_upload_file_cached_skips_single_download_services(mock_upload, tmp_path):
+    mock_upload.return_value = 'https://file.io/xyz'
+    cache_path = tmp_path / "uploads.json"
+
+    upload_file_cached('audio.wav', 'deadbeef', service='file.io', cache_path=str(cache_path))
+    upload_file_cached('audio.wav', 'deadbeef', service='file.io', cache_path=str(cache_path))
+
+    assert mock_upload.call_count == 2
+    assert not cache_path.exists()
+
+@patch('yawt.audio_handler.requests.post')
+def test_upload_file_sends_optional_fields(mock_post, tmp_path):
+    audio_file = tmp_path / "audio.wav"
+    audio_file.write_bytes(b'RIFF' + b'\x00' * 64)
+    mock_post.return_value = MagicMock(status_code=200, text='https://0x0.st/abc.wav\n')
+
+    assert upload_file(str(audio_file), secret='s3cret', expires='24') == 'https://0x0.st/abc.wav'
+    encoder = mock_post.call_args.kwargs['data'].encoder
+    assert set(encoder.fields) == {'file', 'secret', 'expires'}
+
+@patch('yawt.audio_handler.requests.get')
+def test_download_audio_streams_in_large_chunks(mock_get, tmp_path):
+    response = MagicMock(status_code=200)
+    response.iter_content.return_value = [b'abc', b'', b'def']
+    mock_get.return_value.__enter__.return_value = response
+
+    file_path = download_audio('https://example.com/audio.wav', destination_dir=str(tmp_path))
+
+    assert open(file_path, 'rb').read() == b'abcdef'
+    assert mock_get.call_args.kwargs['stream'] is True
+    response.iter_content.assert_called_once_with(chunk_size=DOWNLOAD_CHUNK_SIZE)
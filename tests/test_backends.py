@@ -0,0 +1,76 @@
+import math
+import numpy as np
+import pytest
+import torch
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from yawt.backends import FasterWhisperBackend, load_faster_whisper_model
+from yawt.exceptions import ModelLoadError
+from yawt.transcription import ModelResources, TranscriptionConfig, transcribe_segments
+
+def test_faster_whisper_backend_transcribe():
+    model = MagicMock()
+    segments = [
+        SimpleNamespace(text=" Hello", avg_logprob=math.log(0.9)),
+        SimpleNamespace(text=" world.", avg_logprob=math.log(0.7)),
+    ]
+    model.transcribe.return_value = (iter(segments), SimpleNamespace(language='en'))
+
+    text, confidence, language = FasterWhisperBackend(model).transcribe(
+        np.zeros(16000, dtype=np.float32), 'en', initial_prompt='Greetings'
+    )
+
+    assert text == "Hello world."
+    assert confidence == pytest.approx(0.8)
+    assert language == 'en'
+    assert model.transcribe.call_args.kwargs['initial_prompt'] == 'Greetings'
+
+def test_faster_whisper_backend_no_segments():
+    model = MagicMock()
+    model.transcribe.return_value = (iter([]), SimpleNamespace(language='fr'))
+    assert FasterWhisperBackend(model).transcribe(np.zeros(16000, dtype=np.float32), 'fr') == ("", 0.0, 'fr')
+
+def test_load_faster_whisper_model_requires_package():
+    with patch('yawt.backends.WhisperModel', None):
+        with pytest.raises(ModelLoadError):
+            load_faster_whisper_model("openai/whisper-large-v3")
+
+def test_load_faster_whisper_model_rejects_unsupported_model():
+    with patch('yawt.backends.WhisperModel', MagicMock()):
+        with pytest.raises(ModelLoadError):
+            load_faster_whisper_model("openai/whisper-tiny")
+
+@patch('yawt.backends.get_device', return_value=torch.device('cpu'))
+def test_load_faster_whisper_model_cpu_int8(mock_get_device):
+    with patch('yawt.backends.WhisperModel') as mock_whisper_model:
+        model_config = load_faster_whisper_model("openai/whisper-large-v3-turbo")
+
+    mock_whisper_model.assert_called_once_with("large-v3-turbo", device="cpu", compute_type="int8")
+    assert model_config.model is None and model_config.processor is None
+    assert isinstance(model_config.backend, FasterWhisperBackend)
+
+def test_transcribe_segments_routes_through_backend():
+    diarization_segments = [
+        {'speaker_id': 'Speaker1', 'start': 0.0, 'end': 1.0},
+        {'speaker_id': 'Speaker2', 'start': 1.0, 'end': 2.0},
+    ]
+    audio_array = np.zeros(16000 * 3, dtype=np.float32)
+    backend = MagicMock()
+    backend.transcribe.return_value = ("text", 0.9, 'en')
+    model_resources = ModelResources(
+        model=None, processor=None, device=torch.device('cpu'),
+        torch_dtype=torch.float32, generate_kwargs={}, batch_size=8, chunk_length_s=30, backend=backend
+    )
+    config = TranscriptionConfig(
+        transcription_timeout=10, max_target_positions=448, buffer_tokens=10, confidence_threshold=0.6,
+        context_prompt="Context"
+    )
+
+    with patch('yawt.transcription.transcribe_batch') as mock_batch:
+        transcripts, failed = transcribe_segments(diarization_segments, audio_array, model_resources, config, main_language='en')
+
+    mock_batch.assert_not_called()
+    assert [t['text'] for t in transcripts] == ["text", "text"]
+    assert failed == []
+    assert backend.transcribe.call_count == 2
+    assert backend.transcribe.call_args.args[2] == "Context"
@@ -0,0 +1,29 @@
+import os
+from yawt.diarization import (
+    get_diarization_cache_path,
+    load_cached_diarization,
+    save_cached_diarization,
+)
+
+SEGMENTS = [
+    {'speaker': 'SPEAKER_00', 'start': 0.0, 'end': 1.5},
+    {'speaker': 'SPEAKER_01', 'start': 1.5, 'end': 3.0},
+]
+
+def test_diarization_cache_round_trip(tmp_path):
+    save_cached_diarization('abc123', SEGMENTS, cache_directory=str(tmp_path))
+    assert load_cached_diarization('abc123', cache_directory=str(tmp_path)) == SEGMENTS
+
+def test_diarization_cache_miss(tmp_path):
+    assert load_cached_diarization('missing', cache_directory=str(tmp_path)) is None
+
+def test_diarization_cache_keyed_by_num_speakers(tmp_path):
+    save_cached_diarization('abc123', SEGMENTS, num_speakers=2, cache_directory=str(tmp_path))
+    assert load_cached_diarization('abc123', cache_directory=str(tmp_path)) is None
+    assert load_cached_diarization('abc123', num_speakers=2, cache_directory=str(tmp_path)) == SEGMENTS
+    assert os.path.basename(get_diarization_cache_path('abc123', 2, str(tmp_path))) == 'abc123-speakers2.json'
+
+def test_diarization_cache_corrupt_entry(tmp_path):
+    with open(get_diarization_cache_path('abc123', cache_directory=str(tmp_path)), 'w') as f:
+        f.write('{not json')
+    assert load_cached_diarization('abc123', cache_directory=str(tmp_path)) is None
@@ -0,0 +1,57 @@
+import argparse
+import pytest
+from yawt.main import map_speakers, format_speaker_id, _lang_to_pt1, validate_output_formats, calculate_cost
+
+def test_map_speakers_assigns_ids_in_order_of_appearance():
+    diarization_segments = [
+        {'speaker': 'SPEAKER_01', 'start': 0.0, 'end': 1.0},
+        {'speaker': 'SPEAKER_00', 'start': 1.0, 'end': 2.0},
+        {'speaker': 'SPEAKER_01', 'start': 2.0, 'end': 3.0},
+    ]
+    speakers = map_speakers(diarization_segments)
+
+    assert speakers == [
+        {'id': 1, 'name': 'Speaker 1'},
+        {'id': 2, 'name': 'Speaker 2'},
+    ]
+    assert [seg['speaker_id'] for seg in diarization_segments] == [1, 2, 1]
+
+def test_map_speakers_many_segments():
+    labels = ['SPEAKER_02', 'SPEAKER_00', 'SPEAKER_02', 'SPEAKER_01'] * 2500
+    diarization_segments = [{'speaker': label} for label in labels]
+    speakers = map_speakers(diarization_segments)
+
+    assert [speaker['id'] for speaker in speakers] == [1, 2, 3]
+    assert [seg['speaker_id'] for seg in diarization_segments[:4]] == [1, 2, 1, 3]
+    assert all(isinstance(seg['speaker_id'], int) for seg in diarization_segments)
+
+def test_map_speakers_empty():
+    assert map_speakers([]) == []
+
+def test_format_speaker_id():
+    assert format_speaker_id(3) == 'Speaker3'
+    assert format_speaker_id(None) is None
+
+def test_lang_to_pt1():
+    assert _lang_to_pt1('en') == 'en'
+    assert _lang_to_pt1('heb') == 'he'
+    assert _lang_to_pt1(None) is None
+
+@pytest.mark.parametrize("formats,expected", [
+    (['text'], ['text']),
+    (['text,SRT', 'stj'], ['text', 'srt', 'stj']),
+    ('text, srt', ['text', 'srt']),
+    ([' text ,, srt '], ['text', 'srt']),
+])
+def test_validate_output_formats(formats, expected):
+    assert validate_output_formats(formats) == expected
+
+def test_validate_output_formats_invalid():
+    with pytest.raises(argparse.ArgumentTypeError):
+        validate_output_formats(['text', 'docx'])
+
+def test_calculate_cost():
+    whisper, diarization, total = calculate_cost(1800, 0.006, 0.18)
+    assert whisper == pytest.approx(0.18)
+    assert diarization == pytest.approx(0.09)
+    assert total == pytest.approx(0.27)
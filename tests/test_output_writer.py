@@ -2,7 +2,7 @@ import os
 import json
 import pytest
 from unittest.mock import patch, mock_open, MagicMock
-from yawt.output_writer import ensure_directory_exists, write_transcriptions
+from yawt.output_writer import ensure_directory_exists, write_transcriptions, write_json, format_srt_timestamp, iter_srt_blocks
 from stjlib import StandardTranscriptionJSON, Metadata, Transcriber, Transcript, Speaker, Segment, Word
 from datetime import datetime, timezone
 
@@ -106,6 +106,39 @@ def test_write_transcriptions_stj(mock_file, mock_makedirs, mock_stj, tmp_path):
     assert segments[1]['text'] == "How are you?"
     assert segments[1]['speaker_id'] == "Speaker2"
 
+def test_write_json(tmp_path):
+    data = {"text": "שלום", "segments": [{"start": 0.0, "confidence": 0.5}]}
+    output_file = tmp_path / "out.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        write_json(data, f)
+    content = output_file.read_text(encoding='utf-8')
+    assert json.loads(content) == data
+    assert "שלום" in content
+
+@patch('yawt.output_writer.orjson', None)
+def test_write_json_without_orjson(tmp_path):
+    data = {"text": "שלום", "segments": [{"start": 0.0, "confidence": 0.5}]}
+    output_file = tmp_path / "out.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        write_json(data, f)
+    content = output_file.read_text(encoding='utf-8')
+    assert json.loads(content) == data
+    assert "שלום" in content
+
+@pytest.mark.parametrize("seconds,expected", [
+    (0.0, "00:00:00,000"),
+    (2.5, "00:00:02,500"),
+    (1.001, "00:00:01,001"),
+    (3723.4567, "01:02:03,456"),
+    (90000.0, "25:00:00,000"),
+])
+def test_format_srt_timestamp(seconds, expected):
+    assert format_srt_timestamp(seconds) == expected
+
+def test_iter_srt_blocks_drops_blank_lines():
+    segment = MagicMock(start=0.0, end=1.0, speaker_id=None, text="\nfirst line\n\nsecond line\n")
+    assert list(iter_srt_blocks([segment], {})) == ["1\n00:00:00,000 --> 00:00:01,000\nfirst line\nsecond line\n\n"]
+
 @patch('os.makedirs')
 @patch('builtins.open', new_callable=mock_open)
 def test_write_transcriptions_srt(mock_file, mock_makedirs, mock_stj, tmp_path):
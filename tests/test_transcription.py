@@ -8,9 +8,34 @@ import pytest
 from unittest.mock import patch, MagicMock, Mock
 from yawt.transcription import (
     get_device,
+    get_torch_dtype,
+    select_attn_implementation,
+    inference_autocast,
+    model_generate_with_timeout,
+    transfer_to_device,
+    DeviceInputBuffer,
     load_and_optimize_model,
-    compute_per_token_confidence,
+    get_bitsandbytes_config,
+    compile_forward_with_static_cache,
+    enable_compile_cache,
+    extract_language_token,
+    quantize_model,
+    compute_batch_token_confidences,
+    top_token_probabilities,
     aggregate_confidence,
+    transcribe_segments,
+    transcribe_single_segment,
+    generate_kwargs_template,
+    integrate_context_prompt,
+    pack_segments,
+    split_window_tokens,
+    transcribe_packed_windows,
+    retry_transcriptions,
+    extract_batch_features,
+    ModelResources,
+    TranscriptionConfig,
+    Bitmap,
+    EncoderCache,
     is_valid_language_code,
     evaluate_confidence,
     TimeoutException,
@@ -18,6 +43,7 @@ from yawt.transcription import (
     WhisperProcessor
 )
 
+import numpy as np
 import torch
 import torch.nn.functional as F
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
@@ -39,6 +65,168 @@ def test_get_device_cpu():
         device = get_device()
         assert device.type == 'cpu'
 
+def test_get_torch_dtype_ampere_uses_bfloat16():
+    with patch('torch.cuda.get_device_capability', return_value=(8, 0)):
+        assert get_torch_dtype(torch.device('cuda')) == torch.bfloat16
+
+def test_get_torch_dtype_pre_ampere_uses_float16():
+    with patch('torch.cuda.get_device_capability', return_value=(7, 5)):
+        assert get_torch_dtype(torch.device('cuda')) == torch.float16
+
+def test_get_torch_dtype_cpu():
+    assert get_torch_dtype(torch.device('cpu')) == torch.float32
+
+def test_select_attn_implementation_flash_on_ampere():
+    with patch('torch.cuda.get_device_capability', return_value=(8, 6)), \
+         patch('transformers.utils.is_flash_attn_2_available', return_value=True):
+        assert select_attn_implementation(torch.device('cuda')) == "flash_attention_2"
+
+def test_select_attn_implementation_sdpa_without_flash_attn():
+    with patch('torch.cuda.get_device_capability', return_value=(8, 6)), \
+         patch('transformers.utils.is_flash_attn_2_available', return_value=False):
+        assert select_attn_implementation(torch.device('cuda')) == "sdpa"
+
+def test_select_attn_implementation_sdpa_on_mps():
+    assert select_attn_implementation(torch.device('mps')) == "sdpa"
+
+def test_inference_autocast_noop_on_cpu():
+    ctx = inference_autocast(torch.device('cpu'), torch.float32)
+    assert not isinstance(ctx, torch.autocast)
+
+def test_model_generate_with_timeout_reuses_worker_thread():
+    import threading
+    threads = []
+    model = MagicMock()
+    inference_mode_states = []
+    model.generate.side_effect = lambda **kwargs: (
+        threads.append(threading.current_thread()) or inference_mode_states.append(torch.is_inference_mode_enabled()) or "output"
+    )
+    inputs = {'input_features': torch.zeros(1, 80, 3000)}
+
+    assert model_generate_with_timeout(model, inputs, {}, transcription_timeout=5) == "output"
+    assert model_generate_with_timeout(model, inputs, {}, transcription_timeout=5) == "output"
+    assert threads[0] is threads[1]
+    assert threads[0] is not threading.current_thread()
+    assert inference_mode_states == [True, True]
+
+def test_model_generate_with_timeout_raises_on_timeout():
+    import threading
+    release = threading.Event()
+    model = MagicMock()
+    model.generate.side_effect = lambda **kwargs: release.wait(5)
+    inputs = {'input_features': torch.zeros(1, 80, 3000)}
+    try:
+        with pytest.raises(TimeoutException):
+            model_generate_with_timeout(model, inputs, {}, transcription_timeout=0.05)
+    finally:
+        release.set()
+
+def test_model_generate_with_timeout_prefers_encoder_outputs():
+    model = MagicMock()
+    model.generate.return_value = "output"
+    inputs = {'input_features': torch.zeros(1, 80, 3000)}
+    encoder_outputs = MagicMock()
+
+    model_generate_with_timeout(model, inputs, {'encoder_outputs': encoder_outputs}, transcription_timeout=5)
+
+    kwargs = model.generate.call_args.kwargs
+    assert kwargs['encoder_outputs'] is encoder_outputs
+    assert 'input_features' not in kwargs
+
+def test_model_generate_with_timeout_encodes_on_worker_under_timeout():
+    import threading
+    release = threading.Event()
+    encoder_threads = []
+    model = MagicMock()
+    model.get_encoder.return_value.side_effect = lambda features: (
+        encoder_threads.append(threading.current_thread()) or release.wait(5) and MagicMock(last_hidden_state=features)
+    )
+    model.generate.return_value = "output"
+    inputs = {'input_features': torch.zeros(1, 80, 3000)}
+    cache = EncoderCache()
+    try:
+        with pytest.raises(TimeoutException):
+            model_generate_with_timeout(model, inputs, {}, transcription_timeout=0.05, encoder_cache=cache, cache_key=(0, 100))
+    finally:
+        release.set()
+    assert encoder_threads[0] is not threading.current_thread()
+
+    # The hung encode finished in the background and was cached, so this call decodes from it
+    assert model_generate_with_timeout(model, inputs, {}, transcription_timeout=5, encoder_cache=cache, cache_key=(0, 100)) == "output"
+    assert model.get_encoder.return_value.call_count == 1
+    kwargs = model.generate.call_args.kwargs
+    assert kwargs['encoder_outputs'].last_hidden_state is inputs['input_features']
+    assert 'input_features' not in kwargs
+
+def test_encoder_cache_reuses_and_evicts():
+    model = MagicMock()
+    model.get_encoder.return_value.side_effect = lambda features: MagicMock(last_hidden_state=features * 2)
+    cache = EncoderCache(max_entries=2)
+    features = torch.ones(1, 80, 4)
+
+    first = cache.get_or_encode((0, 100), model, features)
+    assert cache.get_or_encode((0, 100), model, features) is first
+    assert model.get_encoder.return_value.call_count == 1
+
+    cache.get_or_encode((100, 200), model, features)
+    cache.get_or_encode((200, 300), model, features)
+    assert len(cache) == 2
+    cache.get_or_encode((0, 100), model, features)  # Evicted, so encoded again
+    assert model.get_encoder.return_value.call_count == 4
+
+def test_model_generate_with_timeout_recovers_after_timeout():
+    import time
+    model = MagicMock()
+    model.generate.side_effect = lambda **kwargs: time.sleep(kwargs.pop('delay')) or "output"
+    inputs = {'input_features': torch.zeros(1, 80, 3000)}
+
+    with pytest.raises(TimeoutException):
+        model_generate_with_timeout(model, inputs, {'delay': 0.5}, transcription_timeout=0.2)
+    # The stuck call still occupies the worker; the next call's timeout starts once it runs
+    assert model_generate_with_timeout(model, inputs, {'delay': 0.0}, transcription_timeout=0.2) == "output"
+
+def test_transfer_to_device_casts_in_one_copy():
+    tensor = torch.ones(2, 3, dtype=torch.float32)
+    moved = transfer_to_device(tensor, torch.device('cpu'), torch.float16)
+    assert moved.dtype == torch.float16
+    assert moved.device.type == 'cpu'
+
+def test_device_input_buffer_on_cpu_skips_copies():
+    buffer = DeviceInputBuffer(torch.device('cpu'), torch.float32)
+    features = torch.ones(1, 4)
+    assert buffer.copy(features) is features  # Nothing to move or cast
+
+    half_buffer = DeviceInputBuffer(torch.device('cpu'), torch.float16)
+    assert half_buffer.copy(features).dtype == torch.float16
+
+def test_transfer_to_device_casts_on_host_on_cuda():
+    tensor = MagicMock()
+    cast = tensor.to.return_value
+    cast.is_pinned.return_value = True
+    transfer_to_device(tensor, torch.device('cuda'), torch.float16)
+    tensor.to.assert_called_once_with(torch.float16)
+    cast.to.assert_called_once_with(torch.device('cuda'), non_blocking=True)
+    cast.pin_memory.assert_not_called()
+
+@patch('yawt.transcription.torch.cuda.Event')
+@patch('yawt.transcription.torch.empty')
+def test_device_input_buffer_reuses_pinned_staging_on_cuda(mock_empty, mock_event):
+    mock_empty.side_effect = lambda shape, **kwargs: MagicMock(shape=shape)
+    buffer = DeviceInputBuffer(torch.device('cuda'), torch.float16)
+    first, second, resized = torch.ones(1, 4), torch.full((1, 4), 2.0), torch.ones(1, 8)
+
+    device_tensor = buffer.copy(first)
+    assert buffer.copy(second) is device_tensor
+    assert mock_empty.call_count == 2  # One pinned staging tensor and one device tensor
+    assert mock_empty.call_args_list[0].kwargs == {'dtype': torch.float16, 'pin_memory': True}
+    host = buffer._host
+    host.copy_.assert_called_with(second)
+    device_tensor.copy_.assert_called_with(host, non_blocking=True)
+    mock_event.return_value.synchronize.assert_called_once()  # Waited for the first copy before restaging
+
+    assert buffer.copy(resized) is not device_tensor
+    assert mock_empty.call_count == 4
+
 @patch('yawt.transcription.WhisperProcessor.from_pretrained')
 @patch('yawt.transcription.AutoModelForSpeechSeq2Seq.from_pretrained')
 @patch('torch.compile')
@@ -73,7 +261,7 @@ def test_load_and_optimize_model(mock_torch_compile, mock_model_pretrained, mock
     with patch('yawt.transcription.get_device', return_value=mock_device), \
          patch('yawt.transcription.MODEL_SETTINGS', mock_model_settings), \
          patch.dict('sys.modules', {'transformers': mock_transformers}):
-        model_config = load_and_optimize_model('test-model-id')
+        model_config = load_and_optimize_model('test-model-id', compile_model=True)
         
         # Assertions to ensure correct behavior
         mock_model_pretrained.assert_called_with(
@@ -93,42 +281,575 @@ def test_load_and_optimize_model(mock_torch_compile, mock_model_pretrained, mock
         assert model_config.batch_size == 16
         assert model_config.chunk_length_s == 30
 
+def test_get_bitsandbytes_config_ignores_other_modes():
+    assert get_bitsandbytes_config("none", torch.device('cuda'), torch.float16) is None
+    assert get_bitsandbytes_config("int4_hqq", torch.device('cuda'), torch.float16) is None
+
+def test_get_bitsandbytes_config_requires_cuda():
+    assert get_bitsandbytes_config("int8", torch.device('cpu'), torch.float32) is None
+
+def test_get_bitsandbytes_config_without_package():
+    with patch.dict('sys.modules', {'bitsandbytes': None}):
+        assert get_bitsandbytes_config("int4", torch.device('cuda'), torch.float16) is None
+
+def test_get_bitsandbytes_config_int4():
+    with patch.dict('sys.modules', {'bitsandbytes': MagicMock()}):
+        int8_config = get_bitsandbytes_config("int8", torch.device('cuda'), torch.float16)
+        int4_config = get_bitsandbytes_config("int4", torch.device('cuda'), torch.bfloat16)
+    assert int8_config.load_in_8bit
+    assert int4_config.load_in_4bit
+    assert int4_config.bnb_4bit_quant_type == "nf4"
+    assert int4_config.bnb_4bit_compute_dtype == torch.bfloat16
+
+def test_enable_compile_cache_sets_stable_directory(tmp_path):
+    import torch._inductor.config as inductor_config
+    with patch.dict('os.environ', {}, clear=True), \
+         patch.object(inductor_config, 'fx_graph_cache', False):
+        enable_compile_cache(str(tmp_path))
+        assert os.environ['TORCHINDUCTOR_CACHE_DIR'] == str(tmp_path)
+        assert os.environ['TORCHINDUCTOR_FX_GRAPH_CACHE'] == "1"
+        assert inductor_config.fx_graph_cache is True
+
+def test_enable_compile_cache_respects_environment(tmp_path):
+    with patch.dict('os.environ', {'TORCHINDUCTOR_CACHE_DIR': '/custom'}, clear=True):
+        enable_compile_cache(str(tmp_path))
+        assert os.environ['TORCHINDUCTOR_CACHE_DIR'] == '/custom'
+
+def _static_cache_processor():
+    processor = MagicMock()
+    processor.feature_extractor.side_effect = lambda audio, **kwargs: {'input_features': torch.zeros(len(audio), 80, 3000)}
+    return processor
+
+@patch('torch.compile')
+def test_compile_forward_with_static_cache(mock_torch_compile):
+    model = MagicMock()
+    eager_forward = model.forward
+    model.generation_config.cache_implementation = None
+    compiled_forward = MagicMock()
+    mock_torch_compile.return_value = compiled_forward
+
+    import threading
+    warmup_threads = []
+    model.generate.side_effect = lambda **kwargs: warmup_threads.append(threading.current_thread())
+
+    assert compile_forward_with_static_cache(model, _static_cache_processor(), torch.device('cpu'), torch.float32, batch_size=4) is True
+    mock_torch_compile.assert_called_once_with(eager_forward, mode="reduce-overhead", fullgraph=True)
+    assert model.forward is compiled_forward
+    assert model.generation_config.cache_implementation == "static"
+    model.generate.assert_called_once()
+    # Warm up where and how the real calls run: on the generate worker, at the batched-pass size
+    assert warmup_threads[0].name.startswith("yawt-generate")
+    assert model.generate.call_args.kwargs['input_features'].shape[0] == 4
+
+@patch('torch.compile')
+def test_compile_forward_with_static_cache_restores_eager_on_failure(mock_torch_compile):
+    model = MagicMock()
+    eager_forward = model.forward
+    model.generation_config.cache_implementation = None
+    model.generate.side_effect = RuntimeError("graph break")
+
+    assert compile_forward_with_static_cache(model, _static_cache_processor(), torch.device('cpu'), torch.float32) is False
+    assert model.forward is eager_forward
+    assert model.generation_config.cache_implementation is None
+
+@patch('yawt.transcription.WhisperProcessor.from_pretrained')
+@patch('yawt.transcription.AutoModelForSpeechSeq2Seq.from_pretrained')
+@patch('torch.compile')
+def test_load_and_optimize_model_without_compile(mock_torch_compile, mock_model_pretrained, mock_proc_pretrained):
+    mock_model_instance = MagicMock()
+    mock_model_instance.dtype = torch.float32
+    mock_model_instance.to.return_value = mock_model_instance
+    mock_model_pretrained.return_value = mock_model_instance
+
+    with patch('yawt.transcription.get_device', return_value=torch.device('cpu')), \
+         patch('yawt.transcription.MODEL_SETTINGS', {'test-model-id': {'batch_size': 16, 'chunk_length_s': 30}}):
+        model_config = load_and_optimize_model('test-model-id')  # Compilation is opt-in
+
+    mock_torch_compile.assert_not_called()
+    assert model_config.model == mock_model_instance
+
+def test_quantize_model_none():
+    model = MagicMock()
+    quantized, mode = quantize_model(model, 'none', torch.device('cpu'), torch.float32)
+    assert quantized is model
+    assert mode == 'none'
+
+def test_quantize_model_int8_dynamic_cpu():
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    quantized, mode = quantize_model(model, 'int8_dynamic', torch.device('cpu'), torch.float32)
+    assert mode == 'int8_dynamic'
+    assert not isinstance(quantized[0], torch.nn.Linear)
+
+def test_quantize_model_int8_dynamic_skipped_on_gpu():
+    model = MagicMock()
+    quantized, mode = quantize_model(model, 'int8_dynamic', torch.device('cuda'), torch.float16)
+    assert quantized is model
+    assert mode == 'none'
+
+def test_quantize_model_invalid_mode():
+    with pytest.raises(ValueError):
+        quantize_model(MagicMock(), 'int2', torch.device('cpu'), torch.float32)
+
 def test_is_valid_language_code():
     # Assuming 'en' is a valid code from iso639
     assert is_valid_language_code('en') is True
     assert is_valid_language_code('EN') is True  # case-insensitive
     assert is_valid_language_code('nonexistent') is False
 
-def test_compute_per_token_confidence_with_scores():
+class _WhisperTokenizer:
+    eos_token_id = 50257
+
+    def __init__(self):
+        self.added_vocab_calls = 0
+
+    def get_added_vocab(self):
+        self.added_vocab_calls += 1
+        return {'<|endoftext|>': 50257, '<|startoftranscript|>': 50258, '<|en|>': 50259,
+                '<|he|>': 50279, '<|transcribe|>': 50360, '<|notimestamps|>': 50364}
+
+def test_extract_language_token_skips_start_of_transcript():
+    tokenizer = _WhisperTokenizer()
+    assert extract_language_token(torch.tensor([[50258, 50279, 50360, 50364, 123]]), tokenizer) == 'he'
+    assert extract_language_token(torch.tensor([[50258, 50259, 50360]]), tokenizer) == 'en'
+    assert tokenizer.added_vocab_calls == 1  # language map is memoized on the tokenizer
+
+def test_extract_language_token_stops_at_text_tokens():
+    tokenizer = _WhisperTokenizer()
+    assert extract_language_token(torch.tensor([[50258, 123, 50259]]), tokenizer) is None
+    assert extract_language_token(torch.tensor([[50258, 50360, 50364]]), tokenizer) is None
+
+def test_compute_batch_token_confidences_stops_after_eos():
+    eos = 9
     mock_output = Mock()
-    # Define scores as a list of tensors, each tensor is [batch_size=1, vocab_size=2]
+    # Row 0 emits EOS at step 0; row 1 keeps generating for both steps
+    mock_output.sequences = torch.tensor([[1, eos, eos], [1, 5, eos]])
     mock_output.scores = [
-        torch.tensor([[0.1, 0.9]]),  # Token 1
-        torch.tensor([[0.8, 0.2]])   # Token 2
+        torch.tensor([[0.1, 0.9], [0.8, 0.2]]),
+        torch.tensor([[0.5, 0.5], [0.3, 0.7]])
     ]
-    confidences = compute_per_token_confidence(mock_output)
-    
-    # Calculate expected confidences using the same method as in the function
-    expected_confidences = [
-        F.softmax(score.float(), dim=-1).max().item()
-        for score in mock_output.scores
+    confidences = compute_batch_token_confidences(mock_output, eos)
+
+    assert len(confidences) == 2
+    assert len(confidences[0]) == 1
+    assert len(confidences[1]) == 2
+    expected_row1 = [F.softmax(score[1], dim=-1).max().item() for score in mock_output.scores]
+    assert confidences[1] == pytest.approx(expected_row1, rel=1e-4)
+
+def test_top_token_probabilities_shape():
+    scores = [torch.randn(3, 5) for _ in range(4)]
+    top = top_token_probabilities(scores)
+
+    assert top.shape == (4, 3)
+    assert top[2, 1].item() == pytest.approx(F.softmax(scores[2][1], dim=-1).max().item())
+
+def test_compute_batch_token_confidences_without_eos_id():
+    mock_output = Mock()
+    mock_output.sequences = torch.tensor([[1, 2, 3], [1, 4, 5]])
+    mock_output.scores = [torch.zeros(2, 4), torch.zeros(2, 4)]
+    confidences = compute_batch_token_confidences(mock_output, None)
+
+    assert confidences == [pytest.approx([0.25, 0.25]), pytest.approx([0.25, 0.25])]
+
+def test_bitmap_add_and_contains():
+    bitmap = Bitmap(20)
+    bitmap.add(0)
+    bitmap.add(9)
+    bitmap.add(19)
+    assert 0 in bitmap and 9 in bitmap and 19 in bitmap
+    assert 1 not in bitmap and 8 not in bitmap
+    assert 20 not in bitmap and -1 not in bitmap
+    assert len(bitmap) == 3
+
+def test_bitmap_add_out_of_range():
+    with pytest.raises(IndexError):
+        Bitmap(4).add(4)
+
+def _model_resources(processor=None, **overrides):
+    """
+    ModelResources around a mock model on the CPU; `overrides` replace individual fields.
+    """
+    if processor is None:
+        processor = MagicMock()
+        processor.feature_extractor.return_value = {'input_features': torch.zeros(1, 80, 3000)}
+        processor.decode.return_value = "hola"
+    fields = dict(
+        model=MagicMock(), processor=processor, device=torch.device('cpu'),
+        torch_dtype=torch.float32, generate_kwargs={}, batch_size=8, chunk_length_s=30
+    )
+    fields.update(overrides)
+    return ModelResources(**fields)
+
+def _config(**overrides):
+    """
+    TranscriptionConfig with the defaults shared by the transcription tests.
+    """
+    fields = dict(transcription_timeout=10, max_target_positions=448, buffer_tokens=10, confidence_threshold=0.6)
+    fields.update(overrides)
+    return TranscriptionConfig(**fields)
+
+def test_transcribe_segments_skips_processed_segments():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': 0.0, 'end': 1.0},
+        {'speaker_id': 2, 'start': 1.0, 'end': 2.0},
     ]
-    
-    assert confidences == pytest.approx(expected_confidences, rel=1e-4)
+    audio_array = np.zeros(16000 * 3, dtype=np.float32)
+    model_resources = _model_resources()
+    config = _config()
+    processed_segments = Bitmap(len(diarization_segments))
+    processed_segments.add(0)
 
-def test_compute_per_token_confidence_no_scores():
-    # Create a Mock without the 'scores' attribute using spec_set
-    mock_output = Mock(spec_set=['sequences'])
-    mock_output.sequences = torch.tensor([[1, 2, 3]])
-    
-    confidences = compute_per_token_confidence(mock_output)
-    assert confidences == [1.0, 1.0, 1.0]
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        return [("text", 0.9, 'en', torch.tensor([1])) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch):
+        transcripts, _ = transcribe_segments(
+            diarization_segments, audio_array, model_resources, config,
+            main_language='en', processed_segments=processed_segments
+        )
+
+    assert [t['speaker_id'] for t in transcripts] == [2]
+    assert 1 in processed_segments
+
+def test_transcribe_segments_upcasts_float16_audio():
+    diarization_segments = [{'speaker_id': 'Speaker1', 'start': 0.0, 'end': 1.0}]
+    audio_array = np.zeros(16000 * 2, dtype=np.float16)
+    model_resources = _model_resources()
+    config = _config()
+    chunk_dtypes = []
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        chunk_dtypes.extend(chunk.dtype for chunk in chunks)
+        return [("text", 0.9, 'en', torch.tensor([1])) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch):
+        transcribe_segments(diarization_segments, audio_array, model_resources, config, main_language='en')
+
+    assert chunk_dtypes == [np.float32]
+
+def test_transcribe_segments_batches_and_preserves_order():
+    diarization_segments = [
+        {'speaker_id': 'Speaker1', 'start': 0.0, 'end': 4.0},
+        {'speaker_id': 'Speaker2', 'start': 4.0, 'end': 5.0},
+    ]
+    audio_array = np.zeros(16000 * 6, dtype=np.float32)
+    model_resources = _model_resources()
+    config = _config()
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        # Shorter chunk is sorted first; label results by chunk length in seconds
+        return [(f"{len(chunk) // 16000}s", 0.9, 'en', torch.tensor([1])) for chunk in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch) as mock_batch, \
+         patch('yawt.transcription.transcribe_with_retry') as mock_retry:
+        transcripts, failed = transcribe_segments(
+            diarization_segments, audio_array, model_resources, config, main_language='en'
+        )
+
+    assert mock_batch.call_count == 1
+    mock_retry.assert_not_called()
+    assert failed == []
+    assert [t['speaker_id'] for t in transcripts] == ['Speaker1', 'Speaker2']
+    assert [t['text'] for t in transcripts] == ['6s', '2s']
+
+def test_transcribe_segments_batch_size_override():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': float(i), 'end': float(i + 1)} for i in range(5)
+    ]
+    audio_array = np.zeros(16000 * 7, dtype=np.float32)
+    model_resources = _model_resources()
+    config = _config()
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        return [("text", 0.9, 'en', torch.tensor([1])) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch) as mock_batch:
+        transcripts, _ = transcribe_segments(
+            diarization_segments, audio_array, model_resources, config, main_language='en', batch_size=2
+        )
+
+    assert [len(call.kwargs['chunks']) for call in mock_batch.call_args_list] == [2, 2, 1]
+    assert len(transcripts) == 5
+
+def test_transcribe_segments_shares_one_mel_buffer():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': float(i), 'end': float(i + 1)} for i in range(3)
+    ]
+    audio_array = np.zeros(16000 * 5, dtype=np.float32)
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        return [("", 0.0, None, None) for _ in chunks]  # Every segment falls back to the sequential path
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch), \
+         patch('yawt.transcription.transcribe_with_retry', return_value=("text", 0.9, 'en', torch.tensor([1, 2]))) as mock_retry, \
+         patch('yawt.transcription.DeviceInputBuffer', side_effect=DeviceInputBuffer) as mock_buffer:
+        transcripts, _ = transcribe_segments(diarization_segments, audio_array, _model_resources(), _config(), main_language='en')
+
+    assert len(transcripts) == 3
+    assert mock_retry.call_count == 3
+    mock_buffer.assert_called_once()
+
+def test_extract_batch_features_pads_to_window():
+    from transformers import WhisperFeatureExtractor
+    chunks = [np.zeros(16000, dtype=np.float32), np.zeros(16000 * 3, dtype=np.float32)]
+    features = extract_batch_features(chunks, WhisperFeatureExtractor())
+    assert features.shape == (2, 80, 3000)
+
+def test_transcribe_segments_passes_prefetched_features():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': float(i), 'end': float(i + 1)} for i in range(3)
+    ]
+    audio_array = np.zeros(16000 * 5, dtype=np.float32)
+    processor = MagicMock()
+    processor.feature_extractor.side_effect = lambda chunks, **kwargs: {'input_features': torch.zeros(len(chunks), 80, 3000)}
+    model_resources = _model_resources(processor, batch_size=2)
+    config = _config()
+    feature_rows = []
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        feature_rows.append(input_features.shape[0])
+        return [("text", 0.9, 'en', torch.tensor([1])) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch):
+        transcripts, _ = transcribe_segments(diarization_segments, audio_array, model_resources, config, main_language='en')
+
+    assert feature_rows == [2, 1]
+    assert len(transcripts) == 3
+
+def test_retry_transcriptions_resolves_failed_segments():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': 0.0, 'end': 1.0},
+        {'speaker_id': 2, 'start': 1.0, 'end': 2.0},
+    ]
+    transcription_segments = [{'speaker_id': 1, 'start': 0.0, 'end': 1.0, 'text': 'hello'}]
+    config = _config()
+
+    with patch('yawt.transcription.transcribe_with_retry', return_value=("hola", 0.9, 'es', torch.tensor([1, 2]))):
+        transcripts, still_failed = retry_transcriptions(
+            np.zeros(16000 * 3, dtype=np.float32), diarization_segments, [diarization_segments[1]],
+            transcription_segments, _model_resources(), config, secondary_language='es'
+        )
+
+    assert still_failed == []
+    assert [(t['speaker_id'], t['text']) for t in transcripts] == [(1, 'hello'), (2, 'hola')]
+
+def test_retry_transcriptions_updates_existing_transcript():
+    diarization_segments = [{'speaker_id': 1, 'start': 0.0, 'end': 1.0}]
+    transcription_segments = [{'speaker_id': 1, 'start': 0.0, 'end': 1.0, 'text': '', 'confidence': 0.0}]
+    config = _config()
+
+    with patch('yawt.transcription.transcribe_with_retry', return_value=("hola", 0.9, 'es', torch.tensor([1, 2]))):
+        transcripts, _ = retry_transcriptions(
+            np.zeros(16000 * 2, dtype=np.float32), diarization_segments, [{'segment_index': 0}],
+            transcription_segments, _model_resources(), config, secondary_language='es'
+        )
+
+    assert len(transcripts) == 1
+    assert transcripts[0]['text'] == 'hola'
+    assert transcripts[0]['confidence'] == pytest.approx(0.9)
+
+def test_main_pass_and_retry_share_encoder_cache_keys():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': 0.0, 'end': 1.0},
+        {'speaker_id': 2, 'start': 1.0, 'end': 2.0},
+    ]
+    audio_array = np.zeros(16000 * 3, dtype=np.float32)
+    config = _config()
+    processed_segments = Bitmap(len(diarization_segments))
+    processed_segments.add(0)
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        return [("", 0.0, None, None) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_batch', side_effect=fake_batch), \
+         patch('yawt.transcription.transcribe_with_retry', return_value=("hola", 0.9, 'es', torch.tensor([1, 2]))) as mock_retry:
+        transcribe_segments(
+            diarization_segments, audio_array, _model_resources(), config,
+            main_language='en', processed_segments=processed_segments
+        )
+        retry_transcriptions(
+            audio_array, diarization_segments, [diarization_segments[1]], [],
+            _model_resources(), config, secondary_language='es'
+        )
+
+    main_key, retry_key = (call.kwargs['cache_key'] for call in mock_retry.call_args_list)
+    assert main_key == retry_key == (16000, 48000)
+
+def test_generate_kwargs_template_built_once_per_language():
+    model_resources = _model_resources()
+    model_resources.processor.get_decoder_prompt_ids.side_effect = lambda language, task: [(1, language)]
+    model_resources.processor.tokenizer.encode.return_value = torch.tensor([[7, 8, 9]])
+    model_resources.processor.tokenizer.eos_token_id = 50257
+    model_resources.processor.tokenizer.get_added_vocab.return_value = {}
+    config = _config(context_prompt="Context")
+    inputs = {'input_features': torch.zeros(1, 128, 3000)}
+    generate_calls = []
+
+    def fake_generate(model, inputs, generate_kwargs, transcription_timeout, **cache_kwargs):
+        generate_calls.append(generate_kwargs)
+        return MagicMock(sequences=torch.tensor([[1, 2]]), scores=None)
+
+    with patch('yawt.transcription.model_generate_with_timeout', side_effect=fake_generate):
+        for _ in range(3):
+            transcribe_single_segment(0, 0.0, 1.0, inputs, model_resources, config, main_language='en')
+        transcribe_single_segment(0, 0.0, 1.0, inputs, model_resources, config, main_language='es')
+
+    assert model_resources.processor.get_decoder_prompt_ids.call_count == 2
+    assert model_resources.processor.tokenizer.encode.call_count == 2
+    assert generate_calls[0] is generate_calls[2]
+    assert generate_calls[0]['forced_decoder_ids'] == [(1, 'en')]
+    assert generate_calls[3]['forced_decoder_ids'] == [(1, 'es')]
+    assert generate_calls[0]['max_new_tokens'] == min(256, 448 - 128 - 3 - 10 - 1)
+
+def test_integrate_context_prompt_returns_int64_ids():
+    processor = MagicMock()
+    processor.tokenizer.return_value = {'input_ids': torch.tensor([[5, 6, 7]], dtype=torch.int32)}
+    decoder_input_ids = integrate_context_prompt("context", processor, torch.device('cpu'), torch.float16)
+
+    assert decoder_input_ids.dtype == torch.int64
+    assert decoder_input_ids.tolist() == [[5, 6, 7]]
+
+def test_integrate_context_prompt_none():
+    assert integrate_context_prompt(None, MagicMock(), torch.device('cpu'), torch.float32) is None
+
+def test_generate_kwargs_template_pins_prompt_ids_on_cuda():
+    model_resources = _model_resources(device=torch.device('cuda'))
+    input_ids = model_resources.processor.tokenizer.encode.return_value
+    input_ids.long.return_value.pin_memory.return_value.to.return_value.shape = (1, 3)
+    generate_kwargs = generate_kwargs_template(model_resources, _config(context_prompt="context"), 'en', 128)
+
+    pinned = input_ids.long.return_value.pin_memory
+    pinned.assert_called_once()
+    pinned.return_value.to.assert_called_once_with(torch.device('cuda'), non_blocking=True)
+    assert generate_kwargs['decoder_input_ids'] is pinned.return_value.to.return_value
+
+def test_generate_kwargs_template_keeps_base_max_new_tokens_cap():
+    model_resources = _model_resources()
+    model_resources.generate_kwargs = {'max_new_tokens': 50}
+    config = _config()
+    generate_kwargs = generate_kwargs_template(model_resources, config, 'en', 128)
+    assert generate_kwargs['max_new_tokens'] == 50
+    assert 'decoder_input_ids' not in generate_kwargs
+
+def test_pack_segments_groups_within_window():
+    segments = [
+        {'start': 0.0, 'end': 5.0},
+        {'start': 5.0, 'end': 20.0},
+        {'start': 20.0, 'end': 31.0},
+        {'start': 31.0, 'end': 70.0},
+        {'start': 70.0, 'end': 72.0},
+    ]
+    assert pack_segments(segments) == [[0, 1], [2], [3], [4]]
+    assert pack_segments(segments, max_window_s=100.0) == [[0, 1, 2, 3, 4]]
+    assert pack_segments([]) == []
+
+def _fake_tokenizer():
+    tokenizer = MagicMock()
+    tokenizer.eos_token_id = 100
+    tokenizer.decode.side_effect = lambda ids, skip_special_tokens=True: " ".join(f"w{i}" for i in ids)
+    return tokenizer
+
+def test_split_window_tokens_by_timestamp():
+    tokens = [1, 2, 3, 4, 100]
+    token_times = [0.1, 1.9, 2.1, 4.0, 4.5]
+    token_confidences = [0.9, 0.7, 0.8, 0.6, 1.0]
+
+    results = split_window_tokens(tokens, token_times, token_confidences, [0.0, 2.0, 10.0], _fake_tokenizer())
+
+    assert [text for text, _ in results] == ["w1 w2", "w3 w4", ""]
+    assert results[0][1] == pytest.approx(0.8)
+    assert results[1][1] == pytest.approx(0.7)
+    assert results[2][1] == 0.0
+
+def test_transcribe_packed_windows_splits_rows():
+    processor = MagicMock()
+    processor.tokenizer = _fake_tokenizer()
+    processor.feature_extractor.return_value = {
+        'input_features': torch.zeros(1, 80, 3000), 'attention_mask': torch.ones(1, 3000, dtype=torch.int32)
+    }
+    model_resources = _model_resources(processor)
+    config = _config()
+    # generate() returns a plain dict when token timestamps are requested
+    outputs = {
+        'sequences': torch.tensor([[50, 1, 2, 100]]),
+        'token_timestamps': torch.tensor([[0.0, 0.5, 3.5, 4.0]]),
+        'scores': [torch.zeros(1, 4)] * 3,
+    }
+
+    with patch('yawt.transcription.model_generate_with_timeout', return_value=outputs) as mock_generate, \
+         patch('yawt.transcription.extract_language_token', return_value='en'):
+        results = transcribe_packed_windows([np.zeros(16000 * 5, dtype=np.float32)], [[0.0, 3.0]], model_resources, config, 'en')
+
+    generate_kwargs = mock_generate.call_args.kwargs['generate_kwargs']
+    assert generate_kwargs['return_token_timestamps'] is True
+    assert generate_kwargs['attention_mask'].shape == (1, 3000)
+    assert results == [[("w1", pytest.approx(0.25), 'en'), ("w2", pytest.approx(0.25), 'en')]]
+
+def test_transcribe_packed_windows_with_tiny_whisper_model():
+    from transformers import WhisperConfig, WhisperFeatureExtractor, WhisperForConditionalGeneration
+    torch.manual_seed(0)
+    model = WhisperForConditionalGeneration(WhisperConfig(
+        vocab_size=51866, d_model=16, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=16, decoder_ffn_dim=16,
+        num_mel_bins=80, max_source_positions=1500, max_target_positions=448
+    )).eval()
+    model.generation_config.alignment_heads = [[0, 0], [0, 1]]
+    processor = MagicMock()
+    processor.feature_extractor = WhisperFeatureExtractor()
+    processor.get_decoder_prompt_ids.return_value = None
+    processor.tokenizer.eos_token_id = 50257
+    processor.tokenizer.get_added_vocab.return_value = {}
+    processor.tokenizer.decode.side_effect = lambda ids, skip_special_tokens=True: " ".join(f"w{i}" for i in ids)
+    model_resources = _model_resources(processor, model=model, generate_kwargs={'max_new_tokens': 4})
+    config = _config(transcription_timeout=60)
+    chunks = [np.zeros(16000 * 4, dtype=np.float32), np.zeros(16000 * 6, dtype=np.float32)]
+
+    attn_implementation = model.config._attn_implementation
+
+    results = transcribe_packed_windows(chunks, [[0.0, 2.0], [0.0]], model_resources, config, 'en')
+
+    # generate() forces eager attention for token timestamps; later decodes must keep the original
+    assert model.config._attn_implementation == attn_implementation == "sdpa"
+    assert [len(window) for window in results] == [2, 1]
+    for window in results:
+        for text, confidence, _ in window:
+            assert isinstance(text, str)
+            assert 0.0 <= confidence <= 1.0
+
+def test_transcribe_segments_packs_short_segments():
+    diarization_segments = [
+        {'speaker_id': 1, 'start': 0.0, 'end': 2.0},
+        {'speaker_id': 2, 'start': 2.0, 'end': 4.0},
+        {'speaker_id': 1, 'start': 4.0, 'end': 6.0},
+    ]
+    audio_array = np.zeros(16000 * 7, dtype=np.float32)
+    model_resources = _model_resources()
+    config = _config(pack_segments=True)
+
+    def fake_packed(chunks, segment_starts, model_resources, config, main_language):
+        # The middle segment gets no words and must fall back to the batched pass
+        return [[("first", 0.9, 'en'), ("", 0.0, 'en'), ("third", 0.9, 'en')] for _ in chunks]
+
+    def fake_batch(chunks, model_resources, config, main_language, input_features=None):
+        return [("second", 0.9, 'en', torch.tensor([1])) for _ in chunks]
+
+    with patch('yawt.transcription.transcribe_packed_windows', side_effect=fake_packed) as mock_packed, \
+         patch('yawt.transcription.transcribe_batch', side_effect=fake_batch) as mock_batch:
+        transcripts, failed = transcribe_segments(diarization_segments, audio_array, model_resources, config, main_language='en')
+
+    assert mock_packed.call_args.args[1] == [[0.0, 2.0, 4.0]]
+    assert [len(call.kwargs['chunks']) for call in mock_batch.call_args_list] == [1]
+    assert failed == []
+    assert [t['text'] for t in transcripts] == ["first", "second", "third"]
 
 def test_aggregate_confidence():
     confidences = [0.8, 0.9, 0.85]
     overall = aggregate_confidence(confidences)
     assert overall == pytest.approx(0.85)
 
+def test_aggregate_confidence_tensor():
+    assert aggregate_confidence(torch.tensor([[0.8], [0.9], [0.85]], dtype=torch.float16)) == pytest.approx(0.85, rel=1e-3)
+    assert aggregate_confidence(torch.empty(0)) == 0.0
+
 def test_evaluate_confidence_high():
     assert evaluate_confidence(0.9, 'en', threshold=0.6, main_language='en') is True
 
@@ -141,6 +862,10 @@ def test_evaluate_confidence_wrong_language():
 def test_evaluate_confidence_no_language():
     assert evaluate_confidence(0.9, None, threshold=0.6, main_language='en') is False
 
+def test_evaluate_confidence_case_insensitive_and_invalid_codes():
+    assert evaluate_confidence(0.9, 'EN', threshold=0.6, main_language='en') is True
+    assert evaluate_confidence(0.9, 'xx', threshold=0.6, main_language='xx') is False
+
 def test_load_and_optimize_model_file_not_found():
     with patch('yawt.transcription.AutoModelForSpeechSeq2Seq.from_pretrained', side_effect=FileNotFoundError):
         with pytest.raises(ModelLoadError):